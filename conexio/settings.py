@@ -184,6 +184,33 @@ else: #fall back the local
     }
 
 
+# Cache
+# Shared Redis cache when REDIS_URL is set, so every gunicorn worker sees the same
+# entries; without it (local dev, tests) a per-process in-memory cache stands in.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+            "KEY_PREFIX": "conexio",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "conexio",
+        }
+    }
+
+
+# stale dashboard/segment entries are rebuilt on a background thread (see customers/cache.py);
+# set to False to recompute inline instead, e.g. under a single-threaded worker
+CACHE_REFRESH_IN_BACKGROUND = os.getenv("CACHE_REFRESH_IN_BACKGROUND", "true").lower() == "true"
+# threads per process doing those background rebuilds; further stale reads wait for a free one
+CACHE_REFRESH_WORKERS = int(os.getenv("CACHE_REFRESH_WORKERS", 2))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -205,7 +232,8 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # simplejwt's JWTAuthentication, but the user query also loads vendor + plan
+        'customers.authentication.VendorJWTAuthentication',
     )
 }
 
@@ -214,11 +242,38 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'ROTATE_REFRESH_TOKENS': True,
+    # access tokens carry vendor_id / plan claims (customers/authentication.py)
+    'TOKEN_OBTAIN_SERIALIZER': 'customers.authentication.VendorTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'customers.authentication.VendorTokenRefreshSerializer',
 }
 
+# trust the signed user/vendor/plan claims of access tokens instead of loading the user
+# on every request; refreshes and recently revoked users still go to the database.
+# Needs REDIS_URL, and the Redis instance should run with maxmemory-policy noeviction
+JWT_STATELESS_AUTH = os.getenv("JWT_STATELESS_AUTH", "false").lower() == "true"
+
+# seconds a worker keeps its plan -> feature table (customers/entitlements.py) before reloading;
+# changes made in the same process clear it at once
+PLAN_FEATURES_TTL = int(os.getenv("PLAN_FEATURES_TTL", 60))
+
+# vendors with at least this many successful transactions get their stats rebuilt from
+# one columnar NumPy read (customers/analytics.py) instead of a grouped SQL query per
+# chunk of customers; tune with `manage.py bench_analytics --vendor <id>`
+ANALYTICS_VECTORIZE_THRESHOLD = int(os.getenv("ANALYTICS_VECTORIZE_THRESHOLD", 1000000))
+
+# recipients the campaign worker (manage.py process_campaigns) sends per batch,
+# one SendGrid request each (at most 1000)
+CAMPAIGN_BATCH_SIZE = int(os.getenv("CAMPAIGN_BATCH_SIZE", 1000))
+# seconds without progress after which a running campaign is taken over by another worker
+CAMPAIGN_STALE_AFTER = int(os.getenv("CAMPAIGN_STALE_AFTER", 300))
+
 
 
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+# base URL of the SendGrid API the campaign mailer (customers/mailer.py) posts to;
+# point it at a local stand-in server when testing
+SENDGRID_API_HOST = os.getenv("SENDGRID_API_HOST", "https://api.sendgrid.com")
+SENDGRID_TIMEOUT = float(os.getenv("SENDGRID_TIMEOUT", 30))  # seconds per batch request
 DEFAULT_FROM_EMAIL = "noreply@ayigotech.live"
 EMAIL_BACKEND = "sendgrid_backend.SendgridBackend"
 SENDGRID_SANDBOX_MODE_IN_DEBUG = False
@@ -228,6 +283,25 @@ SENDGRID_SANDBOX_MODE_IN_DEBUG = False
 PAYSTACK_CALLBACK_URL = os.getenv("PAYSTACK_CALLBACK_URL", "http://127.0.0.1:8000")
 PAYSTACK_KEY = os.getenv("PAYSTACK_KEY")
 
+# shared Paystack client (customers/paystack.py): seconds, retries on 429/5xx
+PAYSTACK_CONNECT_TIMEOUT = float(os.getenv("PAYSTACK_CONNECT_TIMEOUT", 5))
+PAYSTACK_READ_TIMEOUT = float(os.getenv("PAYSTACK_READ_TIMEOUT", 20))
+PAYSTACK_MAX_RETRIES = int(os.getenv("PAYSTACK_MAX_RETRIES", 3))
+PAYSTACK_RETRY_BACKOFF = float(os.getenv("PAYSTACK_RETRY_BACKOFF", 0.5))
+PAYSTACK_POOL_SIZE = int(os.getenv("PAYSTACK_POOL_SIZE", 10))
+
+# manage.py sync_paystack: Paystack requests in flight overall / per vendor
+PAYSTACK_SYNC_CONCURRENCY = int(os.getenv("PAYSTACK_SYNC_CONCURRENCY", 8))
+PAYSTACK_SYNC_PER_VENDOR = int(os.getenv("PAYSTACK_SYNC_PER_VENDOR", 2))
+# seconds re-read behind each sync cursor; Paystack filters on createdAt, so a transaction
+# that succeeds later than this after it was created is only picked up by the webhook
+PAYSTACK_SYNC_OVERLAP = int(os.getenv("PAYSTACK_SYNC_OVERLAP", 86400))
+
+# webhook buffer (manage.py flush_paystack_webhooks): events written per batch, and
+# seconds between checks when it runs as a worker with --poll
+PAYSTACK_WEBHOOK_FLUSH_SIZE = int(os.getenv("PAYSTACK_WEBHOOK_FLUSH_SIZE", 100))
+PAYSTACK_WEBHOOK_FLUSH_INTERVAL = int(os.getenv("PAYSTACK_WEBHOOK_FLUSH_INTERVAL", 30))
+
 
 
 # Internationalization
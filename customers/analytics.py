@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.db import connections
+from django.db.models import BigIntegerField, F, Func
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+from .models import PaystackTransaction
+
+
+
+""" columnar analytics for large vendors
+
+    A vendor's successful transactions are loaded once as three NumPy columns
+    (customer id, amount, paid_at), ordered by customer so every customer is one
+    contiguous run, and per-customer aggregates are computed with grouped reductions
+    (ufunc.reduceat over the run starts) instead of per-row Python or a grouped SQL
+    query per chunk of customers.
+
+    Amounts are kept as exact integers in hundredths of a kobo and timestamps as
+    integer microseconds since the epoch, so results match the SQL path exactly.
+    stats.rebuild_customer_stats switches to this above ANALYTICS_VECTORIZE_THRESHOLD
+    transactions; `manage.py bench_analytics` compares the paths.
+"""
+
+LOAD_CHUNK_SIZE = 10000
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+class EpochMicroseconds(Func):
+    """ datetime column -> integer microseconds since the epoch, computed by the database
+        (converting per row in Python costs far more than the aggregation itself) """
+    output_field = BigIntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection, template="CAST(EXTRACT(EPOCH FROM %(expressions)s) * 1000000 AS BIGINT)",
+            **extra_context,
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # stored as "YYYY-MM-DD HH:MM:SS[.ffffff]"; julianday() is not precise to the microsecond
+        # and strftime rounds fractional seconds, so whole seconds and microseconds are read apart
+        return super().as_sql(
+            compiler, connection,
+            template=(
+                "(CAST(strftime('%%%%s', substr(%(expressions)s, 1, 19)) AS INTEGER) * 1000000"
+                " + CAST(substr(%(expressions)s, 21, 6) AS INTEGER))"
+            ),
+            **extra_context,
+        )
+
+
+@dataclass
+class CustomerAggregates:
+    customer_ids: np.ndarray  # sorted, unique
+    total_spent: np.ndarray  # hundredths of a kobo
+    order_count: np.ndarray
+    orders_recent: np.ndarray
+    last_paid_at: np.ndarray  # microseconds since the epoch
+
+    def __len__(self):
+        return len(self.customer_ids)
+
+
+def to_micros(value):
+    return (value - EPOCH) // ONE_MICROSECOND
+
+
+def from_micros(value):
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def load_transaction_columns(vendor):
+    """ (customer_ids, amounts, paid_at) arrays of the vendor's successful transactions, ordered by customer """
+    rows = (
+        PaystackTransaction.objects.filter(customer__vendor=vendor, status="success")
+        .order_by("customer_id")
+        .values_list("customer_id", Cast(Round(F("amount") * 100), BigIntegerField()), EpochMicroseconds("paid_at"))
+    )
+    # every column is already an integer, so rows go straight from the cursor into
+    # arrays without Django's per-row converters
+    chunks = []
+    with connections[rows.db].cursor() as cursor:
+        cursor.execute(*rows.query.sql_with_params())
+        while rows := cursor.fetchmany(LOAD_CHUNK_SIZE):
+            chunks.append(np.array(rows, dtype=np.int64))
+
+    if not chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    columns = np.concatenate(chunks)
+    return columns[:, 0], columns[:, 1], columns[:, 2]
+
+
+def aggregate_columns(customer_ids, amounts, paid_at, recent_since):
+    """ per-customer sums/counts/max over customer-ordered columns; recent_since in epoch microseconds """
+    if not len(customer_ids):
+        empty = np.empty(0, dtype=np.int64)
+        return CustomerAggregates(empty, empty, empty, empty, empty)
+
+    starts = np.flatnonzero(np.r_[True, customer_ids[1:] != customer_ids[:-1]])
+    return CustomerAggregates(
+        customer_ids=customer_ids[starts],
+        total_spent=np.add.reduceat(amounts, starts),
+        order_count=np.diff(np.r_[starts, len(customer_ids)]),
+        orders_recent=np.add.reduceat((paid_at >= recent_since).astype(np.int64), starts),
+        last_paid_at=np.maximum.reduceat(paid_at, starts),
+    )
+
+
+def customer_aggregates(vendor, recent_days, now=None):
+    """ CustomerAggregates of every customer of the vendor with at least one successful transaction """
+    now = now or timezone.now()
+    customer_ids, amounts, paid_at = load_transaction_columns(vendor)
+    return aggregate_columns(customer_ids, amounts, paid_at, to_micros(now - timedelta(days=recent_days)))
@@ -1,4 +1,8 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
 
 
 
@@ -6,6 +10,13 @@ class CustomersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'customers'
 
+    def ready(self):
+        from . import signals  # noqa: F401  registers the cache invalidation receivers
+
+        if settings.JWT_STATELESS_AUTH and not isinstance(caches["default"], RedisCache):
+            # token revocation lives in the cache; a per-process cache would miss other workers' revocations
+            raise ImproperlyConfigured("JWT_STATELESS_AUTH requires the shared Redis cache (set REDIS_URL)")
+
 
        
        
\ No newline at end of file
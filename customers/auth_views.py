@@ -11,6 +11,7 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.decorators import login_required
 from .models import Vendor, SubscriptionPlan, Feature, PaystackCustomer
 from .serializers import FeatureSerializer, SubscriptionPlanSerializer
+from .authentication import VendorRefreshToken
 from django.utils.timezone import now
 from .utils import (generate_dummy_customers_and_transactions)
 from django.db.models import Sum, Max
@@ -50,7 +51,7 @@ def signup(request):
     user.save()
 
     # Generate JWT token
-    refresh = RefreshToken.for_user(user)
+    refresh = VendorRefreshToken.for_user(user)
     return Response({
         'message': 'Signup Successful, Login to complete registration',
         'status': True,
@@ -123,7 +124,7 @@ def signin(request):
             }, status=status.HTTP_403_FORBIDDEN)
 
         # All good — generate tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = VendorRefreshToken.for_user(user)
         return Response({
             'message': 'Login successful',
             'status': True,
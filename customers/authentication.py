@@ -0,0 +1,192 @@
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .models import User, Vendor, SubscriptionPlan
+
+
+
+""" request-scoped vendor resolution
+
+    VendorJWTAuthentication loads the token's user together with its vendor and
+    subscription plan in one joined query, so `request.user.vendor` costs nothing
+    afterwards. Views decorated with @vendor_required get it as `request.vendor`,
+    or the standard 404 when the user has no vendor profile.
+
+    Stateless mode (settings.JWT_STATELESS_AUTH):
+    tokens carry vendor_id / plan_id / plan claims, stamped from the database when
+    they are issued or refreshed. Access tokens are then trusted as signed, and the
+    user, vendor and plan are built from the claims without any query; other fields
+    load lazily on first access; views that read more of the vendor than its ids
+    use @vendor_required(load=True) to fetch the row once. Claims are only trusted
+    while the shared cache holds the user's auth state (password hash, blank once
+    inactive) and it matches the token's password hash claim; saving a user or
+    vendor drops that state and marks the user revoked, so tokens issued before
+    take the database path until they are refreshed. The state has no expiry and
+    is rebuilt by the database path, so a missing entry only costs a query. The
+    app refuses to start in this mode without the shared Redis cache.
+"""
+
+VENDOR_CLAIMS = ("vendor_id", "plan_id", "plan")
+REVOKED_KEY = "auth_revoked:{}"
+AUTH_STATE_KEY = "auth_state:{}"
+
+
+def load_token_user(user_id):
+    return User.objects.select_related("vendor__subscription_plan").get(**{api_settings.USER_ID_FIELD: user_id})
+
+
+def set_vendor_claims(token, user):
+    vendor = getattr(user, "vendor", None)
+    plan = vendor.subscription_plan if vendor else None
+    token["vendor_id"] = vendor.id if vendor else None
+    token["plan_id"] = plan.id if plan else None
+    token["plan"] = plan.name if plan else None
+    if api_settings.REVOKE_TOKEN_CLAIM not in token:
+        # kept from login, like simplejwt's CHECK_REVOKE_TOKEN claim, so refreshing never renews it
+        token[api_settings.REVOKE_TOKEN_CLAIM] = get_md5_hash_password(user.password)
+
+
+def remember_auth_state(user):
+    """ what stateless requests are checked against: the password hash, blank while the user is inactive """
+    active = user.is_active or not api_settings.CHECK_USER_IS_ACTIVE
+    cache.set(AUTH_STATE_KEY.format(user.pk), get_md5_hash_password(user.password) if active else "", timeout=None)
+
+
+def revoke_token_claims(user_id):
+    """ make access tokens issued until now fall back to the database """
+    lifetime = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    cache.set(REVOKED_KEY.format(user_id), time.time(), timeout=int(lifetime) + 1)
+    cache.delete(AUTH_STATE_KEY.format(user_id))
+
+
+def claims_revoked(token):
+    revoked_at = cache.get(REVOKED_KEY.format(token[api_settings.USER_ID_CLAIM]))
+    return revoked_at is not None and token.get("iat", 0) <= revoked_at
+
+
+def claims_trusted(token):
+    """ the token's claims may stand in for the database: user active, password unchanged, not revoked """
+    if not all(claim in token for claim in VENDOR_CLAIMS):
+        return False
+    state = cache.get(AUTH_STATE_KEY.format(token[api_settings.USER_ID_CLAIM]))
+    return bool(state) and state == token.get(api_settings.REVOKE_TOKEN_CLAIM) and not claims_revoked(token)
+
+
+def user_from_claims(token):
+    """ unsaved-looking model instances with only their ids loaded; no query """
+    user = User.from_db(DEFAULT_DB_ALIAS, [api_settings.USER_ID_FIELD], [token[api_settings.USER_ID_CLAIM]])
+    vendor = None
+    if token["vendor_id"] is not None:
+        vendor = Vendor.from_db(
+            DEFAULT_DB_ALIAS, ["id", "user_id", "subscription_plan_id"],
+            [token["vendor_id"], user.pk, token["plan_id"]],
+        )
+        Vendor.user.field.set_cached_value(vendor, user)
+        if token["plan_id"] is not None:
+            plan = SubscriptionPlan.from_db(DEFAULT_DB_ALIAS, ["id", "name"], [token["plan_id"], token["plan"]])
+            Vendor.subscription_plan.field.set_cached_value(vendor, plan)
+    User.vendor.related.set_cached_value(user, vendor)
+    return user
+
+
+class VendorRefreshToken(RefreshToken):
+    """ RefreshToken whose access tokens carry fresh vendor/plan claims """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.user = user
+        return token
+
+    @property
+    def access_token(self):
+        # issuing (login) has the user at hand; refreshing re-reads it once
+        user = getattr(self, "user", None)
+        if user is None:
+            try:
+                user = load_token_user(self[api_settings.USER_ID_CLAIM])
+            except User.DoesNotExist:
+                raise InvalidToken(_("User not found"))
+        set_vendor_claims(self, user)
+        return super().access_token
+
+
+class VendorTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = VendorRefreshToken
+
+
+class VendorTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = VendorRefreshToken
+
+    def validate(self, attrs):
+        # simplejwt looks the token's user up with .get() and would answer 500 once it is deleted
+        try:
+            return super().validate(attrs)
+        except User.DoesNotExist:
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+
+class VendorJWTAuthentication(JWTAuthentication):
+    """ JWTAuthentication whose user query also joins the vendor and its plan """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if settings.JWT_STATELESS_AUTH and claims_trusted(validated_token):
+            return user_from_claims(validated_token)
+
+        try:
+            user = load_token_user(user_id)
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        if settings.JWT_STATELESS_AUTH:
+            remember_auth_state(user)
+        return user
+
+
+def get_request_vendor(request):
+    """ the authenticated user's vendor, or None; no query once VendorJWTAuthentication ran """
+    return getattr(request.user, "vendor", None)  # missing reverse one-to-one raises an AttributeError subclass
+
+
+def vendor_required(view=None, *, load=False):
+    """ sets request.vendor for the view, answering 404 when the user has no vendor
+
+        @vendor_required(load=True) is for views reading more than the vendor's ids
+        (paystack_secret, user.email, ...): a vendor built from token claims is then
+        fetched once with its user and plan, instead of a query per deferred field.
+    """
+    if view is None:
+        return lambda view: vendor_required(view, load=load)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        vendor = get_request_vendor(request)
+        if vendor is None:
+            return Response({"error": "Vendor not found"}, status=404)
+        if load and vendor.get_deferred_fields():
+            vendor = Vendor.objects.select_related("user", "subscription_plan").get(pk=vendor.pk)
+        request.vendor = vendor
+        return view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+
+
+""" per-vendor cache versioning
+
+    Every cached vendor result is keyed with the vendor's current data version,
+    e.g. "vendor_dashboard:12:v1721690000000000001". Ingesting customers or
+    transactions bumps the version, so all of that vendor's cached results are
+    missed from then on and recomputed, on every worker sharing the cache; old
+    entries simply age out.
+
+    get_or_compute adds stale-while-revalidate on top: an expired entry is still
+    served while a single worker rebuilds it on a small bounded thread pool.
+
+    vendor_etag gives clients an ETag of the response body it last served fresh,
+    remembered under the vendor's version, so a poll with a matching If-None-Match
+    gets a 304 before the view runs any query. Stale responses carry no ETag.
+"""
+
+VERSION_KEY = "vendor_version:{}"
+ETAG_KEY = "etag:{}:{}:v{}:{}"
+
+# the cache entry get_or_compute served in this request, and whether it was stale
+_served = ContextVar("served", default=None)
+
+logger = logging.getLogger(__name__)
+
+
+def _fresh_version():
+    # never reuses a version even if the counter itself was evicted from the cache
+    return time.time_ns()
+
+
+def vendor_version(vendor_id):
+    key = VERSION_KEY.format(vendor_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_vendor_version(vendor_id):
+    key = VERSION_KEY.format(vendor_id)
+    try:
+        return cache.incr(key)
+    except ValueError:  # not cached yet, or evicted
+        version = _fresh_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def vendor_cache_key(vendor_id, name):
+    return f"{name}:{vendor_id}:v{vendor_version(vendor_id)}"
+
+
+def vendor_fallback_key(vendor_id, name):
+    """ unversioned key of the last value computed for any version, served while a new one is built """
+    return f"{name}:{vendor_id}:latest"
+
+
+def _acquire(lock_key, timeout):
+    # cache.add is atomic on Redis and LocMem: exactly one caller gets the lock
+    return cache.add(lock_key, True, timeout=timeout)
+
+
+def _store(key, value, fresh_for, stale_for, fallback_key=None):
+    entry = {"value": value, "fresh_until": time.time() + fresh_for}
+    cache.set(key, entry, timeout=fresh_for + stale_for)
+    if fallback_key:
+        cache.set(fallback_key, entry, timeout=fresh_for + stale_for)
+    return entry
+
+
+def _serve(entry, stale=False):
+    _served.set({"fresh_until": entry["fresh_until"], "stale": stale or entry["fresh_until"] <= time.time()})
+    return entry["value"]
+
+
+_refresh_pool = None
+_refresh_slots = threading.BoundedSemaphore(settings.CACHE_REFRESH_WORKERS)
+
+
+def _refresh(key, compute, fresh_for, stale_for, lock_key, fallback_key):
+    close_old_connections()
+    try:
+        _store(key, compute(), fresh_for, stale_for, fallback_key)
+    except Exception:
+        logger.exception("Background refresh of %s failed", key)
+    finally:
+        cache.delete(lock_key)
+        _refresh_slots.release()
+        close_old_connections()
+
+
+def _refresh_in_background(key, compute, fresh_for, stale_for, lock_key, fallback_key):
+    """ hand the recompute to the bounded refresh pool; False when every worker is busy """
+    global _refresh_pool
+    if not _refresh_slots.acquire(blocking=False):
+        return False
+    if _refresh_pool is None:
+        _refresh_pool = ThreadPoolExecutor(max_workers=settings.CACHE_REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+    _refresh_pool.submit(_refresh, key, compute, fresh_for, stale_for, lock_key, fallback_key)
+    return True
+
+
+def get_or_compute(key, compute, fresh_for, stale_for=0, lock_timeout=60, wait_for=0.2, fallback_key=None):
+    """ Stale-while-revalidate read with single-flight recomputation.
+
+    - fresh value (younger than fresh_for): returned as is
+    - stale value (kept stale_for seconds longer): returned as is, and one recompute is
+      handed to a bounded pool of CACHE_REFRESH_WORKERS threads; the cache lock means
+      only one worker rebuilds a given key, and when the pool is busy a later read retries
+    - no value (first use, or the vendor version moved on): the lock holder computes it
+      inline; everyone else waits wait_for seconds once, then gets the last value stored
+      under fallback_key (possibly of an older version) or computes it themselves
+    """
+    lock_key = f"lock:{key}"
+    entry = cache.get(key)
+
+    if entry is not None:
+        if entry["fresh_until"] <= time.time() and _acquire(lock_key, lock_timeout):
+            if not settings.CACHE_REFRESH_IN_BACKGROUND:
+                try:
+                    return _serve(_store(key, compute(), fresh_for, stale_for, fallback_key))
+                finally:
+                    cache.delete(lock_key)
+            if not _refresh_in_background(key, compute, fresh_for, stale_for, lock_key, fallback_key):
+                cache.delete(lock_key)
+        return _serve(entry)
+
+    if not _acquire(lock_key, lock_timeout):
+        time.sleep(wait_for)
+        if (entry := cache.get(key)) is not None:
+            return _serve(entry)
+        if fallback_key and (entry := cache.get(fallback_key)) is not None:
+            return _serve(entry, stale=True)  # may belong to an older version
+        # nothing to serve yet; do not block the request on the lock holder
+        return _serve({"value": compute(), "fresh_until": time.time() + fresh_for})
+
+    try:
+        return _serve(_store(key, compute(), fresh_for, stale_for, fallback_key))
+    finally:
+        cache.delete(lock_key)
+
+
+def _etag_matches(etag, header):
+    # weak comparison: proxies and GZipMiddleware may have weakened our ETag
+    tags = parse_etags(header)
+    return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
+
+
+def _body_etag(data):
+    return quote_etag(hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest())
+
+
+def vendor_etag(name, max_age):
+    """ conditional GET for views returning a vendor's derived data.
+
+    The ETag is a hash of the body served, kept for the query string under the
+    vendor's data version until that body stops being fresh: the rest of the
+    get_or_compute freshness window, or max_age for views not reading through it
+    (time alone moves segments such as "recency_days >= 30"). A stale body gets no
+    ETag, so a client never revalidates against data older than it looks. Use
+    below @vendor_required.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            params = hashlib.md5(repr(sorted(request.GET.lists())).encode()).hexdigest()
+            etag_key = ETAG_KEY.format(name, request.vendor.id, vendor_version(request.vendor.id), params)
+            etag = cache.get(etag_key)
+
+            if etag and _etag_matches(etag, request.headers.get("If-None-Match", "")):
+                response = HttpResponseNotModified()
+                response["ETag"] = etag
+            else:
+                token = _served.set(None)
+                try:
+                    response = view(request, *args, **kwargs)
+                    served = _served.get()
+                finally:
+                    _served.reset(token)
+                if response.status_code != 200:
+                    return response
+                fresh_for = max_age if served is None else min(max_age, served["fresh_until"] - time.time())
+                if not (served and served["stale"]) and fresh_for > 0:
+                    response["ETag"] = etag = _body_etag(response.data)
+                    cache.set(etag_key, etag, timeout=fresh_for)
+            response["Cache-Control"] = "private, no-cache"  # always revalidate, never share
+            return response
+        return wrapper
+    return decorator
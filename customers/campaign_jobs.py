@@ -0,0 +1,218 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils.timezone import now
+from .models import Campaign, CampaignRecipient
+from .segments import AUDIENCE_CHUNK_SIZE, audience_chunks
+from .mailer import SendGridMailer, SENDGRID_MAX_PERSONALIZATIONS
+from .templating import MessageTemplate
+
+
+
+""" background campaign sending
+
+    send_campaign only freezes the segment rule into a queued Campaign row and
+    answers 202; a repeated request with the same Idempotency-Key gets the same
+    campaign back. `manage.py process_campaigns` claims queued campaigns one at a
+    time (skip-locked, so several workers can run side by side).
+
+    The audience is streamed from the database a chunk at a time (segments.
+    audience_chunks: customer id, email and first name only) and each chunk is
+    bulk-written to the CampaignRecipient ledger and sent before the next is read,
+    so memory stays flat and the first emails go out after the first chunk rather
+    than after the whole audience. Sending repeatedly takes the next
+    CAMPAIGN_BATCH_SIZE pending recipients, marks them sending, makes one SendGrid
+    request for them (placeholders filled in per recipient from templating.py) and
+    marks them sent or failed.
+
+    A worker that dies leaves its campaign running with an old heartbeat; after
+    CAMPAIGN_STALE_AFTER seconds another worker takes it over and carries on from
+    the freeze cursor and the first pending recipient. Recipients that were
+    mid-request when the worker died are marked failed rather than resent, so
+    nobody is mailed twice.
+"""
+
+INTERRUPTED_ERROR = "worker stopped while this batch was being sent; not resent to avoid a duplicate"
+
+
+def enqueue_campaign(vendor, segment, rule, channel, subject, message, idempotency_key=None):
+    """ queue a campaign, or return the one already queued under the same idempotency key """
+    if idempotency_key:
+        existing = Campaign.objects.filter(vendor=vendor, idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+    try:
+        with transaction.atomic():
+            return Campaign.objects.create(
+                vendor=vendor, segment=segment, rule=rule, channel=channel, subject=subject, message=message,
+                idempotency_key=idempotency_key or None,
+            )
+    except IntegrityError:
+        if not idempotency_key:
+            raise
+        # the same request arrived twice at once and the other one won
+        return Campaign.objects.get(vendor=vendor, idempotency_key=idempotency_key)
+
+
+def claim_campaign():
+    """ mark the oldest queued (or abandoned running) campaign running and return it, or None """
+    stale = now() - timedelta(seconds=settings.CAMPAIGN_STALE_AFTER)
+    with transaction.atomic():
+        campaign = (
+            Campaign.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Campaign.QUEUED)
+                | Q(status=Campaign.RUNNING) & (Q(heartbeat_at__lt=stale) | Q(heartbeat_at__isnull=True))
+            )
+            .order_by("created_at").first()
+        )
+        if campaign is None:
+            return None
+        campaign.status = Campaign.RUNNING
+        campaign.started_at = campaign.started_at or now()
+        campaign.heartbeat_at = now()
+        campaign.save(update_fields=["status", "started_at", "heartbeat_at"])
+    return campaign
+
+
+class CampaignTakenOver(Exception):
+    """ another worker took the campaign over (this one was presumed dead) """
+
+
+def _freeze_chunk(campaign, chunk):
+    """ add one audience chunk to the ledger and move the campaign's freeze cursor past it """
+    with transaction.atomic():
+        # the row lock and cursor check keep two workers from writing the same chunk
+        locked = Campaign.objects.select_for_update().get(pk=campaign.pk)
+        if locked.audience_frozen_through != campaign.audience_frozen_through:
+            raise CampaignTakenOver()
+        CampaignRecipient.objects.bulk_create([
+            CampaignRecipient(campaign=campaign, customer_id=customer_id, email=email, first_name=first_name)
+            for customer_id, email, first_name in chunk
+        ])
+        campaign.audience_frozen_through = chunk[-1][0]
+        campaign.total_recipients = locked.total_recipients + len(chunk)
+        campaign.save(update_fields=["audience_frozen_through", "total_recipients"])
+
+
+def _mark_frozen(campaign):
+    campaign.audience_frozen_at = now()
+    campaign.save(update_fields=["audience_frozen_at"])
+
+
+def _fail_interrupted(campaign):
+    """ recipients a previous worker was sending to when it stopped: delivery unknown, never resent """
+    with transaction.atomic():
+        failed = campaign.recipients.filter(status=CampaignRecipient.SENDING).update(
+            status=CampaignRecipient.FAILED, error=INTERRUPTED_ERROR,
+        )
+        if failed:
+            Campaign.objects.filter(pk=campaign.pk).update(failed_count=F("failed_count") + failed)
+    return failed
+
+
+def _claim_batch(campaign, batch_size):
+    """ the next pending (id, customer_id, email, first_name) rows, marked sending before anything goes out """
+    with transaction.atomic():
+        batch = list(
+            CampaignRecipient.objects.select_for_update(skip_locked=True)
+            .filter(campaign=campaign, status=CampaignRecipient.PENDING).order_by("id")
+            .values_list("id", "customer_id", "email", "first_name")[:batch_size]
+        )
+        if batch:
+            CampaignRecipient.objects.filter(id__in=[row[0] for row in batch]).update(status=CampaignRecipient.SENDING)
+            Campaign.objects.filter(pk=campaign.pk).update(heartbeat_at=now())
+    return batch
+
+
+def _record_batch(campaign, batch, result):
+    with transaction.atomic():
+        CampaignRecipient.objects.filter(id__in=[row[0] for row in batch]).update(
+            status=CampaignRecipient.SENT if result.ok else CampaignRecipient.FAILED,
+            error=result.error,
+            sent_at=now() if result.ok else None,
+        )
+        Campaign.objects.filter(pk=campaign.pk).update(
+            sent_count=F("sent_count") + result.sent,
+            failed_count=F("failed_count") + result.failed,
+            heartbeat_at=now(),
+        )
+
+
+def _send_pending(campaign, mailer, template, batch_size):
+    """ send every pending recipient, one request per batch; returns the errors of failed batches """
+    errors = []
+    while batch := _claim_batch(campaign, batch_size):
+        _, customer_ids, emails, first_names = zip(*batch)
+        substitutions = template.substitutions_batch(customer_ids, first_names)
+        result = mailer.send_batch(list(zip(emails, substitutions)), campaign.subject, campaign.message)
+        _record_batch(campaign, batch, result)
+        if not result.ok:
+            errors.append(result.error)
+    return errors
+
+
+def _finish(campaign, status, error=""):
+    # the ledger is the source of truth for the counts
+    counts = campaign.recipients.aggregate(
+        sent=Count("pk", filter=Q(status=CampaignRecipient.SENT)),
+        failed=Count("pk", filter=Q(status=CampaignRecipient.FAILED)),
+    )
+    campaign.sent_count = counts["sent"]
+    campaign.failed_count = counts["failed"]
+    campaign.status = status
+    campaign.error = error
+    campaign.finished_at = now()
+    campaign.save(update_fields=["sent_count", "failed_count", "status", "error", "finished_at"])
+
+
+def process_campaign(campaign, batch_size=None, chunk_size=AUDIENCE_CHUNK_SIZE):
+    """ stream a claimed campaign's audience into the ledger, sending each chunk as it lands """
+    batch_size = min(batch_size or settings.CAMPAIGN_BATCH_SIZE, SENDGRID_MAX_PERSONALIZATIONS)
+    if campaign.channel != "email":
+        _finish(campaign, Campaign.FAILED, f"{campaign.channel} campaigns are not supported yet")
+        return campaign
+
+    errors = []
+    try:
+        if interrupted := _fail_interrupted(campaign):
+            errors.append(f"{interrupted} recipient(s) {INTERRUPTED_ERROR}")
+
+        mailer = SendGridMailer()
+        template = MessageTemplate(campaign.message)
+        if campaign.audience_frozen_at is None:
+            # each chunk is in the ledger before it is sent, and sent before the next is read
+            chunks = audience_chunks(
+                campaign.vendor, campaign.rule, chunk_size, after=campaign.audience_frozen_through,
+                now=campaign.started_at,
+            )
+            for chunk in chunks:
+                _freeze_chunk(campaign, chunk)
+                errors += _send_pending(campaign, mailer, template, batch_size)
+            _mark_frozen(campaign)
+        errors += _send_pending(campaign, mailer, template, batch_size)
+    except CampaignTakenOver:
+        return campaign
+    except Exception as e:
+        _finish(campaign, Campaign.FAILED, str(e))
+        return campaign
+
+    # failed requests don't stop the campaign; their recipients are marked failed
+    error = f"{len(errors)} batch(es) failed, last: {errors[-1]}" if errors else ""
+    _finish(campaign, Campaign.COMPLETED, error)
+    return campaign
+
+
+def process_campaigns(limit=None, batch_size=None, on_done=None):
+    """ process queued campaigns until none are left (or `limit` are done); returns how many ran """
+    processed = 0
+    while limit is None or processed < limit:
+        campaign = claim_campaign()
+        if campaign is None:
+            break
+        process_campaign(campaign, batch_size)
+        if on_done:
+            on_done(campaign)
+        processed += 1
+    return processed
@@ -1,21 +1,28 @@
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.utils.timezone import now
-from datetime import timedelta
-from .models import PaystackCustomer, PaystackTransaction, Vendor
+from .models import Campaign
+from .segments import get_segment_rule
+from .serializers import CampaignSerializer
+from .campaign_jobs import enqueue_campaign
+from .authentication import VendorJWTAuthentication, vendor_required
 from .utils import send_email_to_customers, send_sms_to_customers, send_email_to_customers_using_sendgrid  # You'll define this utility
-from rest_framework.permissions import AllowAny
-from django.views.decorators.csrf import csrf_exempt
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.views import APIView
 
+CAMPAIGN_CHANNELS = ("email", "sms")
+
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@vendor_required
 def send_campaign(request):
-    user = request.user
+    """
+    Queues a campaign to a segment and answers 202 with its id right away;
+    `manage.py process_campaigns` sends it in batches (see campaign_jobs.py).
+    Send an Idempotency-Key header to make retries safe.
+    Progress: GET /api/campaigns/<id>/
+    """
     segment = request.data.get("segment")
     channel = request.data.get("channel")
     subject = request.data.get("subject", "")
@@ -24,56 +31,41 @@ def send_campaign(request):
     if not segment or not channel or not message:
         return Response({"error": "Missing fields"}, status=400)
 
-    try:
-        vendor = Vendor.objects.get(user=user)
-    except Vendor.DoesNotExist:
-        return Response({"error": "Vendor not found"}, status=404)
-
-    customers = PaystackCustomer.objects.filter(vendor=vendor)
-    transactions = PaystackTransaction.objects.filter(customer__vendor=vendor, status="success")
-
-    now_dt = now()
-    tx_map = {tx.customer_id: [] for tx in customers}
-    for tx in transactions:
-        tx_map.setdefault(tx.customer_id, []).append(tx)
+    if channel not in CAMPAIGN_CHANNELS:
+        return Response({"error": f"Unknown channel: {channel}"}, status=400)
 
-    # Filter customers by segment
-    matched_customers = []
-    for customer in customers:
-        txs = tx_map.get(customer.id, [])
-        total_spent = sum(tx.amount for tx in txs) / 100
-        order_count = len(txs)
-        last_tx_date = max((tx.paid_at for tx in txs), default=None)
+    vendor = request.vendor
 
-        if segment == "Loyal Customers":
-            recent_order_count = sum(1 for tx in txs if tx.paid_at >= now_dt - timedelta(days=90))
-            if order_count >= 3 and recent_order_count >= 3:
-                matched_customers.append(customer)
+    rule = get_segment_rule(vendor, segment)
+    if rule is None:
+        return Response({"error": f"Unknown segment: {segment}"}, status=400)
 
-        elif segment == "High Value Customers" and total_spent > 500:
-            matched_customers.append(customer)
+    # a retried request with the same key gets the campaign it already queued
+    idempotency_key = request.headers.get("Idempotency-Key")
+    campaign = enqueue_campaign(vendor, segment, rule, channel, subject, message, idempotency_key)
 
-        elif segment == "At-Risk Customers" and last_tx_date and (now_dt - last_tx_date).days >= 30:
-            matched_customers.append(customer)
+    return Response({
+        "message": f"Campaign to {segment} customers via {channel} queued.",
+        "campaign_id": campaign.id,
+        "status": campaign.status,
+    }, status=202)
 
-        elif segment == "Dormant Customers" and (not txs or (last_tx_date and (now_dt - last_tx_date).days >= 90)):
-            matched_customers.append(customer)
 
-    # Send messages
-    if channel == "email":
-        send_email_to_customers_using_sendgrid(matched_customers, subject, message)
-    elif channel == "sms":
-        pass
-       
 
-    return Response({
-        "message": f"Campaign sent to {len(matched_customers)} {segment} customers via {channel}."
-    })
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@vendor_required
+def campaign_status(request, campaign_id):
+    """ progress of one of the vendor's campaigns """
+    campaign = Campaign.objects.filter(vendor=request.vendor, id=campaign_id).first()
+    if campaign is None:
+        return Response({"error": "Campaign not found"}, status=404)
+    return Response(CampaignSerializer(campaign).data)
 
 
 
 class TestSendEmailsView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [VendorJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -1,19 +1,23 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import PaystackCustomer, PaystackTransaction, Vendor
-import requests
-from django.utils import timezone
-from datetime import timedelta, datetime
-import pytz 
-from django.db.models import Sum, Prefetch
-from django.core.cache import cache
+from .models import PaystackCustomer, CustomerSegment
+from .queries import filter_customers, CUSTOMER_FIELDS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .stats import summarize_customer_stats
+from .segments import BUILTIN_SEGMENTS, get_segment_rule, segment_counts, segment_members
+from .rfm import compute_rfm
+from .serializers import CustomerSegmentSerializer
+from .cache import get_or_compute, vendor_cache_key, vendor_etag, vendor_fallback_key
+from .authentication import vendor_required
+from django.core.paginator import Paginator
 
 
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@vendor_required
+@vendor_etag("vendor_dashboard", max_age=300)
 def vendor_dashboard(request):
     """
     Returns dashboard metrics for the authenticated vendor:
@@ -27,70 +31,33 @@ def vendor_dashboard(request):
         - Dormant customers: no order or inactive ≥90 days
 
     Optimization:
-    - Uses prefetch_related to minimize DB hits
-    - Uses aggregate to compute totals in the database
-    - Optional: caches the response for 5 minutes
+    - Reads the per-customer CustomerStats rollup, never individual transactions
+    - Caches the response for 5 minutes, keyed on the vendor's data version; for an hour
+      after that the stale copy is still served while one worker rebuilds it
+    - ETag / If-None-Match: unchanged polls get a 304 without touching the data
     """
-    user = request.user
+    vendor = request.vendor  # resolved with the user by authentication.VendorJWTAuthentication
 
-    # Get associated vendor
-    try:
-        vendor = Vendor.objects.get(user=user)
-    except Vendor.DoesNotExist:
-        return Response({"error": "Vendor not found"}, status=404)
-
-    # Optional: Check cache
-    cache_key = f"vendor_dashboard_{vendor.id}"
-    cached = cache.get(cache_key)
-    if cached:
-        return Response(cached)
-
-    # Prefetch successful transactions per customer
-    transactions_qs = PaystackTransaction.objects.filter(status="success")
-    customers = PaystackCustomer.objects.filter(vendor=vendor).prefetch_related(
-        Prefetch("transactions", queryset=transactions_qs)
+    cache_key = vendor_cache_key(vendor.id, "vendor_dashboard")
+    data = get_or_compute(cache_key, lambda: _dashboard_data(vendor), fresh_for=300, stale_for=3600,
+        fallback_key=vendor_fallback_key(vendor.id, "vendor_dashboard"),
     )
+    return Response(data)
 
-    # All transactions
-    transactions = transactions_qs.filter(customer__vendor=vendor)
 
-    # Total metrics
-    total_customers = customers.count()
-    total_orders = transactions.count()
-    total_value = transactions.aggregate(total=Sum("amount"))["total"] or 0
-    total_value /= 100  # Convert kobo to naira
+def _dashboard_data(vendor):
+    # One small rollup row per customer instead of every transaction
+    summary = summarize_customer_stats(vendor)
+    total_customers = summary["total_customers"]
+    total_orders = summary["total_orders"]
+    total_value = summary["total_value"] / 100  # Convert kobo to naira
     avg_order_value = round(total_value / total_orders, 2) if total_orders else 0
+    loyal = summary["loyal_customers"]
+    high_value = summary["high_value_customers"]
+    at_risk = summary["at_risk_customers"]
+    dormant = summary["dormant_customers"]
 
-    # Segment customers
-    now = timezone.now()
-    loyal = high_value = at_risk = dormant = 0
-
-    for customer in customers:
-        txs = customer.transactions.all()
-        order_count = txs.count()
-        total_spent = sum(tx.amount for tx in txs) / 100  # Convert to naira
-        last_tx_date = max((tx.paid_at for tx in txs), default=None)
-
-        # Loyal: ≥3 orders in last 90 days
-        recent_order_count = sum(
-            1 for tx in txs if tx.paid_at and tx.paid_at >= now - timezone.timedelta(days=90)
-        )
-        if order_count >= 3 and recent_order_count >= 3:
-            loyal += 1
-
-        # High-value: total spend > ₦500
-        if total_spent > 500:
-            high_value += 1
-
-        # At-risk: last order ≥ 30 days ago
-        if last_tx_date and (now - last_tx_date).days >= 30:
-            at_risk += 1
-
-        # Dormant: no tx or inactive ≥ 90 days
-        if not txs or (last_tx_date and (now - last_tx_date).days >= 90):
-            dormant += 1
-
-    data = {
+    return {
         "total_customers": total_customers,
         "total_orders": total_orders,
         "average_order_value": avg_order_value,
@@ -102,85 +69,49 @@ def vendor_dashboard(request):
         }
     }
 
-    # Optional cache
-    cache.set(cache_key, data, timeout=300)  # 5 minutes
-
-    return Response(data)
-
 
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@vendor_required
 def dynamic_segment_filter(request):
     """
     Filters vendor's Paystack customers dynamically based on provided criteria:
     - spend_more_than
     - ordered_in_last
     - last_visited
+
+    Runs against the locally synced customers/transactions, so every transaction
+    counts (not just the latest 100) and latency follows the size of the result.
+    Matches are paginated with `page` and `page_size`.
     """
 
-    user = request.user
     data = request.data
     filter_type = data.get("filter_type")
-    value = float(data.get("value", 0))
-    days = int(data.get("days", 0))
-
     try:
-        vendor = Vendor.objects.get(user=user)
-    except Vendor.DoesNotExist:
-        return Response({"error": "Vendor not found"}, status=404)
-
-    if not vendor.paystack_secret:
-        return Response({"error": "Vendor has not connected Paystack"}, status=400)
-
-    headers = {
-        "Authorization": f"Bearer {vendor.paystack_secret}"
-    }
-
-    customer_res = requests.get("https://api.paystack.co/customer", headers=headers).json()
-    customers = customer_res.get("data", [])
+        value = float(data.get("value", 0))
+        days = int(data.get("days", 0))
+        page_number = int(data.get("page", 1))
+        page_size = min(int(data.get("page_size", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return Response({"error": "value, days, page and page_size must be numbers"}, status=400)
 
-    tx_res = requests.get("https://api.paystack.co/transaction", headers=headers, params={"perPage": 100}).json()
-    transactions = [tx for tx in tx_res.get("data", []) if tx.get("status") == "success"]
+    vendor = request.vendor
 
-    now = datetime.utcnow()
-    tx_map = {}
-    for tx in transactions:
-        customer_code = tx.get("customer", {}).get("customer_code")
-        if customer_code:
-            tx_map.setdefault(customer_code, []).append(tx)
-
-    matching_customers = []
-
-    for customer in customers:
-        code = customer.get("customer_code")
-        txs = tx_map.get(code, [])
-
-        total_spent = sum(tx["amount"] / 100 for tx in txs)
-        num_orders = len(txs)
-        last_tx_date = max(
-            (datetime.strptime(tx["paid_at"], "%Y-%m-%dT%H:%M:%S.%fZ") for tx in txs),
-            default=None
-        )
-
-        # Apply filter
-        if filter_type == "spend_more_than" and total_spent > value:
-            matching_customers.append(customer)
-
-        elif filter_type == "ordered_in_last":
-            period_start = now - timedelta(days=days)
-            recent_orders = [tx for tx in txs if datetime.strptime(tx["paid_at"], "%Y-%m-%dT%H:%M:%S.%fZ") >= period_start]
-            if len(recent_orders) >= value:
-                matching_customers.append(customer)
+    try:
+        customers = filter_customers(vendor, filter_type, value=value, days=days)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
 
-        elif filter_type == "last_visited":
-            if last_tx_date and (now - last_tx_date).days <= days:
-                matching_customers.append(customer)
+    paginator = Paginator(customers.order_by("id").values(*CUSTOMER_FIELDS), max(page_size, 1))
+    page = paginator.get_page(page_number)
 
     return Response({
-        "count": len(matching_customers),
-        "customers": matching_customers
+        "count": paginator.count,
+        "page": page.number,
+        "num_pages": paginator.num_pages,
+        "customers": list(page.object_list)
     })
 
 
@@ -188,6 +119,8 @@ def dynamic_segment_filter(request):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@vendor_required
+@vendor_etag("get_customer_segments", max_age=86400)
 def get_customer_segments(request):
     """
     Return customer segmentation data for the authenticated vendor.
@@ -197,66 +130,166 @@ def get_customer_segments(request):
     - At-Risk Customers: last transaction >= 30 days ago
     - Dormant Customers: no transaction or inactive for >= 90 days
 
-    Results are cached per vendor for 1 day.
+    Results are cached per vendor for 1 day, keyed on the vendor's data version
+    so any new customers/transactions invalidate them immediately. For a day after
+    that the stale copy is still served while one worker rebuilds it.
+    Polls with a matching If-None-Match get a 304.
     """
-    user = request.user
-    try:
-        vendor = Vendor.objects.get(user=user)
-    except Vendor.DoesNotExist:
-        return Response({"error": "Vendor not found"}, status=404)
-
-    cache_key = f"segments_{vendor.id}"
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return Response(cached_data)
-
-    # Fetch vendor's customers and their transactions
-    customers = PaystackCustomer.objects.filter(vendor=vendor)
-    transactions = PaystackTransaction.objects.filter(
-        customer__vendor=vendor,
-        status="success"
+    vendor = request.vendor
+
+    cache_key = vendor_cache_key(vendor.id, "segments")
+    data = get_or_compute(cache_key, lambda: _segment_data(vendor), fresh_for=86400, stale_for=86400,
+        fallback_key=vendor_fallback_key(vendor.id, "segments"),
     )
+    return Response(data)
+
+
+def _segment_data(vendor):
+    summary = summarize_customer_stats(vendor)
+    return {
+        "loyal_customers": summary["loyal_customers"],
+        "high_value_customers": summary["high_value_customers"],
+        "at_risk_customers": summary["at_risk_customers"],
+        "dormant_customers": summary["dormant_customers"],
+    }
+
 
-    # Organize transactions per customer code
-    tx_map = {}
-    for tx in transactions:
-        tx_map.setdefault(tx.customer.customer_code, []).append(tx)
 
-    now = timezone.now()
-    loyal = high_value = at_risk = dormant = 0
 
-    for customer in customers:
-        txs = tx_map.get(customer.customer_code, [])
-        total_spent = sum(tx.amount for tx in txs) / 100  # kobo to naira
-        last_tx_date = max((tx.paid_at for tx in txs), default=None)
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+@vendor_required
+def list_create_segments(request):
+    """
+    GET: built-in and custom segments with their rules and member counts
+         (all counts come from a single aggregate query)
+    POST: create a custom segment, e.g.
+          {"name": "Win-back", "rule": "recency_days >= 60 AND order_count >= 2"}
+    """
+    vendor = request.vendor
+
+    if request.method == "POST":
+        serializer = CustomerSegmentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        if CustomerSegment.objects.filter(vendor=vendor, name=serializer.validated_data["name"]).exists():
+            return Response({"name": ["A segment with this name already exists"]}, status=400)
+        segment = serializer.save(vendor=vendor)
+        return Response(CustomerSegmentSerializer(segment).data, status=201)
 
-        # Loyal: ≥3 orders in last 90 days
-        recent_order_count = sum(
-            1 for tx in txs if tx.paid_at >= now - timedelta(days=90)
+    rules = {name: rule for name, (_, rule) in BUILTIN_SEGMENTS.items()}
+    custom = list(CustomerSegment.objects.filter(vendor=vendor).values_list("name", "rule"))
+    rules.update(custom)
+    counts = segment_counts(vendor, rules)
+    custom_names = {name for name, _ in custom}
+
+    return Response({"segments": [
+        {"name": name, "rule": rule, "custom": name in custom_names, "count": counts[name]}
+        for name, rule in rules.items()
+    ]})
+
+
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@vendor_required
+def segment_customers(request):
+    """
+    Lists the members of one segment (built-in or custom), paginated:
+    ?segment=<name>&page=1&page_size=50
+    """
+    vendor = request.vendor
+
+    rule = get_segment_rule(vendor, request.query_params.get("segment"))
+    if rule is None:
+        return Response({"error": "Unknown segment"}, status=400)
+
+    try:
+        page_number = int(request.query_params.get("page", 1))
+        page_size = min(int(request.query_params.get("page_size", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "page and page_size must be numbers"}, status=400)
+
+    members = segment_members(vendor, rule).order_by("customer_id").values(
+        *[f"customer__{field}" for field in CUSTOMER_FIELDS], "total_spent", "order_count", "last_paid_at"
+    )
+    paginator = Paginator(members, max(page_size, 1))
+    page = paginator.get_page(page_number)
+
+    customers = []
+    for row in page.object_list:
+        customer = {field: row[f"customer__{field}"] for field in CUSTOMER_FIELDS}
+        customer.update(
+            total_spent=row["total_spent"] / 100,  # kobo to naira
+            order_count=row["order_count"],
+            last_order=row["last_paid_at"],
         )
-        if len(txs) >= 3 and recent_order_count >= 3:
-            loyal += 1
-
-        # High value: spent > 500
-        if total_spent > 500:
-            high_value += 1
-
-        # At-risk: last order ≥ 30 days ago
-        if last_tx_date and (now - last_tx_date).days >= 30:
-            at_risk += 1
-
-        # Dormant: no tx or inactive ≥ 90 days
-        if not txs or (last_tx_date and (now - last_tx_date).days >= 90):
-            dormant += 1
-
-    data = {
-        "loyal_customers": loyal,
-        "high_value_customers": high_value,
-        "at_risk_customers": at_risk,
-        "dormant_customers": dormant,
-    }
+        customers.append(customer)
 
-    # Cache the result for 1 day (86400 seconds)
-    cache.set(cache_key, data, timeout=86400)
+    return Response({
+        "count": paginator.count,
+        "page": page.number,
+        "num_pages": paginator.num_pages,
+        "customers": customers
+    })
 
-    return Response(data)
+
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@vendor_required
+@vendor_etag("rfm", max_age=3600)
+def rfm_scores(request):
+    """
+    RFM scores of the vendor's customers (each 1-5 from the vendor's own quantiles):
+    - distribution: customers per score for recency, frequency and monetary
+    - segments: customers per RFM segment (Champions, At Risk, ...)
+    - customers: per-customer scores, best first, paginated with ?page=1&page_size=50
+
+    Scores are computed in one pass (see rfm.py) and cached per vendor data version,
+    so pages and polls after the first read only the cache and one page of customers.
+    """
+    vendor = request.vendor
+
+    try:
+        page_number = int(request.query_params.get("page", 1))
+        page_size = min(int(request.query_params.get("page_size", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "page and page_size must be numbers"}, status=400)
+
+    cache_key = vendor_cache_key(vendor.id, "rfm")
+    rfm = get_or_compute(cache_key, lambda: compute_rfm(vendor), fresh_for=3600, stale_for=86400,
+        fallback_key=vendor_fallback_key(vendor.id, "rfm"),
+    )
+
+    paginator = Paginator(range(len(rfm["customer_ids"])), max(page_size, 1))
+    page = paginator.get_page(page_number)
+    rows = slice(page.object_list.start, page.object_list.stop)
+
+    ids = rfm["customer_ids"][rows].tolist()
+    emails = dict(PaystackCustomer.objects.filter(id__in=ids).values_list("id", "email"))
+    customers = [
+        {
+            "id": customer_id,
+            "email": emails.get(customer_id),
+            "recency": int(r),
+            "frequency": int(f),
+            "monetary": int(m),
+            "rfm": f"{r}{f}{m}",
+            "segment": rfm["segment_names"][segment],
+        }
+        for customer_id, r, f, m, segment in zip(
+            ids, rfm["recency"][rows], rfm["frequency"][rows], rfm["monetary"][rows], rfm["segment"][rows]
+        )
+    ]
+
+    return Response({
+        "distribution": rfm["distribution"],
+        "segments": rfm["segments"],
+        "count": paginator.count,
+        "page": page.number,
+        "num_pages": paginator.num_pages,
+        "customers": customers
+    })
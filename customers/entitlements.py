@@ -0,0 +1,72 @@
+import threading
+import time
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+from .models import SubscriptionPlan
+from .authentication import get_request_vendor
+
+
+
+""" plan -> feature entitlements
+
+    Every plan's feature names are loaded with one query on first use and kept in
+    process memory, so `vendor.has_feature(name)` is a dict + set lookup instead of
+    an M2M query per call. Saving plans/features or changing a plan's features
+    clears the table in this process (see signals.py); PLAN_FEATURES_TTL bounds how
+    long other worker processes can keep serving the old table.
+"""
+
+_table = None  # (loaded_at, {plan_id: (feature names in id order, frozenset of them)})
+_lock = threading.Lock()
+_EMPTY = ((), frozenset())
+
+
+def _load():
+    plans = {}
+    rows = (
+        SubscriptionPlan.features.through.objects
+        .order_by("feature_id")
+        .values_list("subscriptionplan_id", "feature__name")
+    )
+    for plan_id, name in rows:
+        plans.setdefault(plan_id, []).append(name)
+    return {plan_id: (tuple(names), frozenset(names)) for plan_id, names in plans.items()}
+
+
+def _plans():
+    global _table
+    table = _table
+    if table is None or time.monotonic() - table[0] > settings.PLAN_FEATURES_TTL:
+        with _lock:
+            table = _table
+            if table is None or time.monotonic() - table[0] > settings.PLAN_FEATURES_TTL:
+                table = _table = (time.monotonic(), _load())
+    return table[1]
+
+
+def plan_feature_names(plan_id):
+    """ feature names of a plan, in the order they were created """
+    return _plans().get(plan_id, _EMPTY)[0]
+
+
+def plan_has_feature(plan_id, name):
+    return name in _plans().get(plan_id, _EMPTY)[1]
+
+
+def invalidate_plan_features():
+    global _table
+    _table = None
+
+
+def HasPlanFeature(feature):
+    """ permission class factory: @permission_classes([IsAuthenticated, HasPlanFeature("Basic Reports")]) """
+
+    class _HasPlanFeature(BasePermission):
+        message = f"Your subscription plan does not include {feature}."
+
+        def has_permission(self, request, view):
+            vendor = get_request_vendor(request)
+            return vendor is not None and vendor.has_feature(feature)
+
+    _HasPlanFeature.__name__ = f"HasPlanFeature({feature!r})"
+    return _HasPlanFeature
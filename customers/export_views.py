@@ -0,0 +1,31 @@
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .authentication import vendor_required
+from .exports import EXPORTS, EXPORT_FORMATS, export_lines
+
+
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@vendor_required
+def export_data(request, dataset, file_format):
+    """
+    Streams the vendor's whole customer base or transaction history as a download:
+    - /api/exports/customers.csv, /api/exports/customers.ndjson
+    - /api/exports/transactions.csv, /api/exports/transactions.ndjson
+
+    Rows are written while they are read (see exports.py), so memory stays flat
+    and the first byte is sent immediately.
+    """
+    if dataset not in EXPORTS or file_format not in EXPORT_FORMATS:
+        return Response({"error": "Unknown export"}, status=404)
+
+    response = StreamingHttpResponse(
+        export_lines(request.vendor, dataset, file_format),
+        content_type=EXPORT_FORMATS[file_format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{dataset}.{file_format}"'
+    return response
@@ -0,0 +1,117 @@
+import csv
+import json
+from decimal import Decimal
+from .models import PaystackCustomer, PaystackTransaction
+
+
+
+""" streaming exports of a vendor's customers and transactions
+
+    Rows are read with values_list(...).iterator(chunk_size=...), which uses a
+    server-side cursor on PostgreSQL, and encoded as they arrive, so memory stays
+    flat however many rows a vendor has and the header goes out before the first
+    query finishes. Amounts are exported in naira (JSON numbers in NDJSON),
+    datetimes in ISO 8601.
+"""
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+CUSTOMER_COLUMNS = (
+    ("customer_code", "customer_code"),
+    ("email", "email"),
+    ("first_name", "first_name"),
+    ("last_name", "last_name"),
+    ("phone", "phone"),
+    ("created_at", "created_at"),
+    ("total_spent", "stats__total_spent"),
+    ("order_count", "stats__order_count"),
+    ("last_order", "stats__last_paid_at"),
+)
+TRANSACTION_COLUMNS = (
+    ("reference", "reference"),
+    ("customer_code", "customer__customer_code"),
+    ("email", "customer__email"),
+    ("amount", "amount"),
+    ("currency", "currency"),
+    ("status", "status"),
+    ("channel", "channel"),
+    ("paid_at", "paid_at"),
+)
+KOBO_COLUMNS = {"total_spent", "amount"}
+DATETIME_COLUMNS = {"created_at", "last_order", "paid_at"}
+
+
+def _customer_rows(vendor):
+    return PaystackCustomer.objects.filter(vendor=vendor).order_by("id")
+
+
+def _transaction_rows(vendor):
+    return PaystackTransaction.objects.filter(customer__vendor=vendor).order_by("id")
+
+
+EXPORTS = {
+    "customers": (_customer_rows, CUSTOMER_COLUMNS),
+    "transactions": (_transaction_rows, TRANSACTION_COLUMNS),
+}
+
+
+class _Echo:
+    """ file-like object whose write() hands the encoded line back to the generator """
+
+    def write(self, value):
+        return value
+
+
+def _records(queryset, columns):
+    names = [name for name, _ in columns]
+    kobo = [i for i, name in enumerate(names) if name in KOBO_COLUMNS]
+    datetimes = [i for i, name in enumerate(names) if name in DATETIME_COLUMNS]
+    for row in queryset.values_list(*[lookup for _, lookup in columns]).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row = list(row)
+        for i in kobo:
+            if row[i] is not None:
+                row[i] = row[i] / 100
+        for i in datetimes:
+            if row[i] is not None:
+                row[i] = row[i].isoformat()
+        yield row
+
+
+def _csv_lines(names, records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(names)
+    batch = []
+    for row in records:
+        batch.append(writer.writerow(row))
+        if len(batch) == EXPORT_CHUNK_SIZE:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def _json_value(value):
+    # amounts stay numbers for NDJSON consumers; anything else (datetimes) becomes text
+    return float(value) if isinstance(value, Decimal) else str(value)
+
+
+def _ndjson_lines(names, records):
+    batch = []
+    for row in records:
+        batch.append(json.dumps(dict(zip(names, row)), default=_json_value) + "\n")
+        if len(batch) == EXPORT_CHUNK_SIZE:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def export_lines(vendor, dataset, file_format):
+    """ generator of encoded chunks for one export; dataset and file_format must be valid keys """
+    rows, columns = EXPORTS[dataset]
+    names = [name for name, _ in columns]
+    records = _records(rows(vendor), columns)
+    if file_format == "csv":
+        return _csv_lines(names, records)
+    return _ndjson_lines(names, records)
@@ -0,0 +1,169 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+from .models import PaystackCustomer, PaystackTransaction
+from .stats import ensure_customer_stats, refresh_customer_stats
+from .cache import bump_vendor_version
+
+
+
+""" bulk ingestion of Paystack payloads
+
+    Each call writes one page of rows with a single `INSERT ... ON CONFLICT DO UPDATE`
+    inside its own transaction, so a page is either fully stored or not at all and the
+    cost per page is a fixed handful of queries no matter how many rows it holds.
+    The CustomerStats rollup of every customer touched is refreshed in the same transaction,
+    and the vendor's cache version is bumped once it commits.
+"""
+
+CUSTOMER_UPDATE_FIELDS = ["email", "first_name", "last_name", "phone"]
+TRANSACTION_UPDATE_FIELDS = ["amount", "currency", "status", "paid_at", "channel"]
+
+
+def _parse_date(value):
+    return parse_datetime(value) if value else None
+
+
+def _build_customer(vendor, cust, created_at=None):
+    return PaystackCustomer(
+        vendor=vendor,
+        customer_code=cust["customer_code"],
+        email=cust.get("email") or "",
+        first_name=cust.get("first_name") or "",
+        last_name=cust.get("last_name") or "",
+        phone=cust.get("phone") or "",
+        created_at=_parse_date(cust.get("createdAt")) or created_at or now(),
+    )
+
+
+def resolve_customer_ids(vendor, codes):
+    """ map customer codes to PaystackCustomer ids with a single IN query """
+    if not codes:
+        return {}
+    return dict(
+        PaystackCustomer.objects.filter(vendor=vendor, customer_code__in=codes)
+        .values_list("customer_code", "id")
+    )
+
+
+def ingest_customers(vendor, rows):
+    """ upsert a page of Paystack customer payloads keyed on (vendor, customer_code) """
+    customers = {}
+    for cust in rows:
+        if cust.get("customer_code"):
+            customers[cust["customer_code"]] = _build_customer(vendor, cust)
+
+    if not customers:
+        return 0
+
+    with transaction.atomic():
+        PaystackCustomer.objects.bulk_create(
+            customers.values(),
+            update_conflicts=True,
+            unique_fields=["vendor", "customer_code"],
+            update_fields=CUSTOMER_UPDATE_FIELDS,
+        )
+        ids = resolve_customer_ids(vendor, customers.keys())
+        # only missing rows are created, and for those the built created_at is the stored one
+        ensure_customer_stats(vendor, {ids[code]: customers[code].created_at for code in ids})
+        transaction.on_commit(lambda: bump_vendor_version(vendor.id))
+    return len(customers)
+
+
+def _conflicting_references(vendor, transactions):
+    """ references of built transactions the upsert on reference can't take: the reference is
+        stored for another vendor's customer, or the reference or transaction_code is already
+        stored paired with a different one (the insert would violate the other unique column
+        and abort the whole page)
+    """
+    stored = (
+        PaystackTransaction.objects.filter(
+            Q(reference__in=transactions.keys())
+            | Q(transaction_code__in=[tx.transaction_code for tx in transactions.values()])
+        )
+        .values_list("reference", "transaction_code", "customer__vendor_id")
+    )
+    by_reference = {reference: (code, vendor_id) for reference, code, vendor_id in stored}
+    by_code = {code: reference for reference, code, _ in stored}
+
+    conflicts, codes_seen = [], set()
+    for reference, tx in transactions.items():
+        code = tx.transaction_code
+        if (
+            by_reference.get(reference, (code, vendor.id)) != (code, vendor.id)
+            or by_code.get(code, reference) != reference
+            or code in codes_seen  # two references of the page share a code
+        ):
+            conflicts.append(reference)
+        codes_seen.add(code)
+    return conflicts
+
+
+def ingest_transactions(vendor, rows):
+    """ upsert a page of Paystack transaction payloads keyed on reference.
+
+        Only successful, paid transactions are stored. Customers embedded in a
+        transaction that are not known locally yet are created first, so a
+        transaction is never dropped just because its customer page arrived later.
+        Rows whose reference or transaction_code collides with a different stored
+        transaction are skipped rather than failing the page.
+    """
+    rows = [
+        tx for tx in rows
+        if tx.get("status") == "success"
+        and tx.get("reference")
+        and (tx.get("customer") or {}).get("customer_code")
+    ]
+    if not rows:
+        return 0
+
+    codes = {tx["customer"]["customer_code"] for tx in rows}
+
+    with transaction.atomic():
+        customer_ids = resolve_customer_ids(vendor, codes)
+
+        missing = {}
+        created_ids = set()
+        for tx in rows:
+            code = tx["customer"]["customer_code"]
+            if code not in customer_ids and code not in missing:
+                missing[code] = _build_customer(vendor, tx["customer"], _parse_date(tx.get("createdAt")))
+        if missing:
+            PaystackCustomer.objects.bulk_create(missing.values(), ignore_conflicts=True)
+            created = resolve_customer_ids(vendor, missing.keys())
+            customer_ids.update(created)
+            created_ids = set(created.values())
+
+        transactions = {}
+        for tx in rows:
+            customer_id = customer_ids.get(tx["customer"]["customer_code"])
+            paid_at = _parse_date(tx.get("paid_at") or tx.get("paidAt"))
+            if not customer_id or not paid_at:
+                continue  # payment not settled
+            transactions[tx["reference"]] = PaystackTransaction(
+                customer_id=customer_id,
+                transaction_code=str(tx.get("id") or tx["reference"]),
+                amount=tx["amount"],
+                currency=tx.get("currency") or "NGN",
+                status=tx["status"],
+                paid_at=paid_at,
+                reference=tx["reference"],
+                channel=tx.get("channel"),
+            )
+
+        for reference in _conflicting_references(vendor, transactions):
+            del transactions[reference]
+
+        if transactions:
+            PaystackTransaction.objects.bulk_create(
+                transactions.values(),
+                update_conflicts=True,
+                unique_fields=["reference"],
+                update_fields=TRANSACTION_UPDATE_FIELDS,
+            )
+        # customers created above get a stats row even if all their transactions were dropped
+        if transactions or created_ids:
+            refresh_customer_stats({tx.customer_id for tx in transactions.values()} | created_ids)
+            transaction.on_commit(lambda: bump_vendor_version(vendor.id))
+    return len(transactions)
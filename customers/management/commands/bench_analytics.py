@@ -0,0 +1,81 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from customers.models import Vendor, PaystackCustomer, PaystackTransaction
+from customers.analytics import customer_aggregates, to_micros
+from customers.stats import RECENT_DAYS, aggregate_customers
+
+
+def python_loop(vendor, now):
+    """ the per-object loop the views used to run: one model instance per transaction """
+    cutoff = now - timedelta(days=RECENT_DAYS)
+    totals = defaultdict(lambda: [0, 0, 0, None])
+    for tx in PaystackTransaction.objects.filter(customer__vendor=vendor, status="success"):
+        row = totals[tx.customer_id]
+        row[0] += tx.amount
+        row[1] += 1
+        row[2] += tx.paid_at >= cutoff
+        row[3] = tx.paid_at if row[3] is None else max(row[3], tx.paid_at)
+    return {cid: (int(spent * 100), orders, recent, to_micros(last)) for cid, (spent, orders, recent, last) in totals.items()}
+
+
+def grouped_sql(vendor, now):
+    rows = aggregate_customers(PaystackCustomer.objects.filter(vendor=vendor), now)
+    return {
+        cid: (int(spent * 100), orders, recent, to_micros(last))
+        for cid, _, spent, orders, recent, last, _ in rows if orders
+    }
+
+
+def vectorized(vendor, now):
+    agg = customer_aggregates(vendor, RECENT_DAYS, now)
+    return agg, len(agg)
+
+
+class Command(BaseCommand):
+    help = 'Time per-customer aggregation of a vendor: Python loop vs grouped SQL vs NumPy columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=int, required=True, help='Vendor id to aggregate')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per method; the best is reported')
+        parser.add_argument('--skip-loop', action='store_true', help='Skip the (slow) Python loop baseline')
+
+    def handle(self, *args, **options):
+        try:
+            vendor = Vendor.objects.get(id=options['vendor'])
+        except Vendor.DoesNotExist:
+            raise CommandError(f"Vendor {options['vendor']} not found")
+
+        now = timezone.now()
+        methods = [("grouped SQL", grouped_sql), ("NumPy columns", vectorized)]
+        if not options['skip_loop']:
+            methods.insert(0, ("Python loop", python_loop))
+
+        timings, results = {}, {}
+        for label, method in methods:
+            best = None
+            for _ in range(max(options['repeat'], 1)):
+                started = time.perf_counter()
+                results[label] = method(vendor, now)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = best
+
+        agg, _ = results["NumPy columns"]
+        as_dict = {
+            int(cid): (int(spent), int(orders), int(recent), int(last))
+            for cid, spent, orders, recent, last in zip(
+                agg.customer_ids, agg.total_spent, agg.order_count, agg.orders_recent, agg.last_paid_at
+            )
+        }
+        if as_dict != results["grouped SQL"]:
+            raise CommandError("NumPy aggregates differ from the grouped SQL results")
+
+        transactions = int(agg.order_count.sum()) if len(agg) else 0
+        self.stdout.write(f'{vendor}: {transactions} transactions, {len(agg)} customers with orders')
+        baseline = timings[methods[0][0]]
+        for label, elapsed in timings.items():
+            self.stdout.write(f'  {label:<14} {elapsed * 1000:10.1f} ms  {baseline / elapsed:6.1f}x')
+        self.stdout.write(self.style.SUCCESS('Results match'))
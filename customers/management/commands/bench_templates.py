@@ -0,0 +1,82 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from customers.templating import MessageTemplate, format_last_order, format_name, format_total_spent
+
+DEFAULT_MESSAGE = "Hi {name}, your last order was on {last_order} and you've spent {total_spent} with us. See you soon, {name}!"
+
+
+def naive_replace(message, first_names, stats):
+    """ a str.replace per placeholder per recipient, as the senders did for {name} """
+    replacements = [
+        (placeholder, formatter) for placeholder, formatter in (
+            ("{name}", lambda first_name, last_paid_at, total_spent: format_name(first_name)),
+            ("{last_order}", lambda first_name, last_paid_at, total_spent: format_last_order(last_paid_at)),
+            ("{total_spent}", lambda first_name, last_paid_at, total_spent: format_total_spent(total_spent)),
+        ) if placeholder in message
+    ]
+    rendered = []
+    for first_name, (last_paid_at, total_spent) in zip(first_names, stats):
+        text = message
+        for placeholder, formatter in replacements:
+            text = text.replace(placeholder, formatter(first_name, last_paid_at, total_spent))
+        rendered.append(text)
+    return rendered
+
+
+def compiled(message, first_names, stats):
+    template = MessageTemplate(message)
+    return template.render_columns(template.format_columns(first_names, stats), len(first_names))
+
+
+class Command(BaseCommand):
+    help = 'Time rendering a campaign message for many recipients: str.replace per recipient vs a compiled template'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=100000, help='Recipients to render for')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per method; the best is reported')
+        parser.add_argument('--message', default=DEFAULT_MESSAGE, help='Template using {name}, {last_order}, {total_spent}')
+
+    def handle(self, *args, **options):
+        count = options['recipients']
+        message = options['message']
+        template = MessageTemplate(message)
+
+        # synthetic recipients, every tenth without a name or any orders
+        now = timezone.now()
+        first_names = [None if i % 10 == 0 else f"Customer{i}" for i in range(count)]
+        stats = [
+            (None, Decimal(0)) if i % 10 == 0
+            else (now - timedelta(minutes=random.randint(0, 525600)), Decimal(random.randint(0, 10000000)))
+            for i in range(count)
+        ]
+        stats_for_template = [
+            tuple(row[["last_paid_at", "total_spent"].index(column)] for column in template.stats_columns)
+            for row in stats
+        ]
+
+        methods = [
+            ("str.replace", lambda: naive_replace(message, first_names, stats)),
+            ("compiled", lambda: compiled(message, first_names, stats_for_template)),
+        ]
+        timings, results = {}, {}
+        for label, method in methods:
+            best = None
+            for _ in range(max(options['repeat'], 1)):
+                started = time.perf_counter()
+                results[label] = method()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = best
+
+        if results["compiled"] != results["str.replace"]:
+            raise CommandError("Compiled template output differs from str.replace")
+
+        self.stdout.write(f'{count} recipients, fields: {", ".join(template.fields) or "none"}')
+        baseline = timings["str.replace"]
+        for label, elapsed in timings.items():
+            self.stdout.write(f'  {label:<12} {elapsed * 1000:10.1f} ms  {baseline / elapsed:6.1f}x')
+        self.stdout.write(self.style.SUCCESS('Results match'))
@@ -0,0 +1,125 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from customers.models import Vendor, CustomerStats
+from customers.queries import encode_cursor, filter_customers, keyset_queryset, DEFAULT_PAGE_SIZE
+from customers.segments import customer_status_expression, customer_status_filter, segment_members
+from customers.stats import summary_aggregates
+
+
+# the vendor_id foreign key index (auto-named) or any of the (vendor, sort key) indexes
+STATS_VENDOR_INDEXES = (
+    "customers_customerstats_vendor_id", "stats_vendor_spent_idx", "stats_vendor_last_paid_idx", "stats_vendor_created_idx",
+)
+
+
+def customer_page(vendor, field, descending, status=None, now=None):
+    """ the customer list's query (onboarding_views.get_paystack_customers) for a page after a cursor """
+    now = now or timezone.now()
+    stats = CustomerStats.objects.filter(vendor=vendor).select_related("customer").annotate(
+        status=customer_status_expression(now)
+    )
+    if status:
+        stats = stats.filter(customer_status_filter(status, now))
+    cursor = encode_cursor(now.isoformat() if field != "total_spent" else "1000.00", 1)
+    return keyset_queryset(stats, field, descending, cursor)[:DEFAULT_PAGE_SIZE + 1]
+
+
+def planned_queries(vendor):
+    """ (label, queryset, indexes the plan must use) for the hot dashboard/segment/customer list paths;
+        a tuple in the list means any one of those indexes
+    """
+    now = timezone.now()
+    return [
+        (
+            "dashboard: rollup totals and built-in segment counts",
+            # summarize_customer_stats' aggregate, grouped so it stays a queryset to EXPLAIN;
+            # it reads every rollup row of the vendor, so any vendor-leading index will do
+            CustomerStats.objects.filter(vendor=vendor).values("vendor").annotate(**summary_aggregates(now)),
+            [STATS_VENDOR_INDEXES],
+        ),
+        (
+            "segment members: total_spent > 500",
+            segment_members(vendor, "total_spent > 500", now).order_by("customer_id"),
+            ["stats_vendor_spent_idx"],
+        ),
+        (
+            "segment members: recency_days >= 30",
+            segment_members(vendor, "recency_days >= 30", now).order_by("customer_id"),
+            ["stats_vendor_last_paid_idx"],
+        ),
+        (
+            "customer list: by total value, next page",
+            customer_page(vendor, "total_spent", True, now=now),
+            ["stats_vendor_spent_idx"],
+        ),
+        (
+            "customer list: by last order, At Risk only, next page",
+            customer_page(vendor, "last_paid_at", True, status="At Risk", now=now),
+            ["stats_vendor_last_paid_idx"],
+        ),
+        (
+            "customer list: by created date, next page",
+            customer_page(vendor, "customer_created_at", False, now=now),
+            ["stats_vendor_created_idx"],
+        ),
+        (
+            "segment filter: spend_more_than",
+            filter_customers(vendor, "spend_more_than", value=500),
+            ["customer_vendor_created_idx", "tx_customer_status_paid_idx"],
+        ),
+        (
+            "segment filter: ordered_in_last",
+            filter_customers(vendor, "ordered_in_last", value=3, days=90),
+            ["customer_vendor_created_idx", "tx_customer_status_paid_idx"],
+        ),
+        (
+            "segment filter: last_visited",
+            filter_customers(vendor, "last_visited", days=30),
+            ["customer_vendor_created_idx", "tx_customer_status_paid_idx"],
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the dashboard and segment queries and check they use the composite indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=int, default=None, help='Vendor id to plan for (default: first vendor)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan')
+
+    def handle(self, *args, **options):
+        vendor = Vendor.objects.filter(id=options['vendor']).first() if options['vendor'] else Vendor.objects.first()
+        vendor = vendor or Vendor(id=0)  # plans do not need data
+
+        failures = 0
+        for label, queryset, indexes in planned_queries(vendor):
+            plan = self.explain(queryset)
+            missing = [
+                " or ".join(name) if isinstance(name, tuple) else name
+                for name in indexes
+                if not any(alternative in plan for alternative in (name if isinstance(name, tuple) else (name,)))
+            ]
+            if missing:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'FAIL {label}: plan does not use {", ".join(missing)}'))
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK   {label}'))
+                if options['verbose_plans']:
+                    self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f'{failures} query plan(s) do not use the expected indexes on {connection.vendor}')
+
+    def explain(self, queryset):
+        """ on PostgreSQL small or freshly loaded tables make a seq scan look cheapest, so
+            seq scans are disabled for the check: it proves the index is usable, not chosen
+            for this particular data size.
+        """
+        if connection.vendor != 'postgresql':
+            return queryset.explain()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
@@ -0,0 +1,27 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from customers.webhooks import flush_webhook_events
+
+
+class Command(BaseCommand):
+    help = 'Write buffered Paystack webhook events into customers and transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Events written per batch')
+        parser.add_argument(
+            '--poll', action='store_true',
+            help='Keep running as a worker, checking for new events every PAYSTACK_WEBHOOK_FLUSH_INTERVAL seconds',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            total = 0
+            while flushed := flush_webhook_events(options['batch_size']):
+                total += flushed
+            if not options['poll']:
+                self.stdout.write(self.style.SUCCESS(f'Flushed {total} webhook event(s)'))
+                break
+            if total:
+                self.stdout.write(f'Flushed {total} webhook event(s)')
+            time.sleep(settings.PAYSTACK_WEBHOOK_FLUSH_INTERVAL)
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from customers.models import Campaign
+from customers.campaign_jobs import process_campaigns
+
+
+class Command(BaseCommand):
+    help = 'Send queued campaigns in batches, recording progress on each campaign'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Recipients per batch')
+        parser.add_argument(
+            '--poll', type=float, default=None,
+            help='Keep running as a worker, checking for new campaigns every POLL seconds',
+        )
+
+    def handle(self, *args, **options):
+        def report(campaign):
+            message = (
+                f'Campaign #{campaign.id} ({campaign.vendor}): {campaign.status}, '
+                f'{campaign.sent_count}/{campaign.total_recipients} sent'
+            )
+            if campaign.status == Campaign.COMPLETED:
+                self.stdout.write(self.style.SUCCESS(message))
+            else:
+                self.stdout.write(self.style.ERROR(f'{message}: {campaign.error}'))
+
+        while True:
+            processed = process_campaigns(batch_size=options['batch_size'], on_done=report)
+            if options['poll'] is None:
+                self.stdout.write(f'Processed {processed} campaign(s)')
+                break
+            if not processed:
+                time.sleep(options['poll'])
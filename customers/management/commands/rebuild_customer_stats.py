@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from customers.models import Vendor
+from customers.stats import rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the CustomerStats rollup from transactions (run daily to age orders_90d)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', type=int, default=None, help='Only rebuild this vendor id')
+
+    def handle(self, *args, **options):
+        vendor = None
+        if options['vendor']:
+            vendor = Vendor.objects.get(id=options['vendor'])
+        written = rebuild_customer_stats(vendor)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {written} customer(s)'))
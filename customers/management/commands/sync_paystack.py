@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from customers.models import Vendor
+from customers.utils import sync_paystack_vendors
+
+
+class Command(BaseCommand):
+    help = 'Sync Paystack customers and transactions for every connected vendor'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.PAYSTACK_SYNC_CONCURRENCY,
+            help='Maximum Paystack requests in flight across all vendors',
+        )
+        parser.add_argument(
+            '--per-vendor', type=int, default=settings.PAYSTACK_SYNC_PER_VENDOR,
+            help='Maximum Paystack requests in flight for a single vendor',
+        )
+        parser.add_argument(
+            '--vendor', type=int, action='append', dest='vendor_ids',
+            help='Only sync this vendor id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        vendors = Vendor.objects.filter(paystack_connected=True).exclude(paystack_secret__isnull=True).exclude(paystack_secret="")
+        if options['vendor_ids']:
+            vendors = vendors.filter(id__in=options['vendor_ids'])
+
+        def report(vendor, result):
+            if 'error' in result:
+                self.stdout.write(self.style.ERROR(f'{vendor} (#{vendor.id}): {result["error"]}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{vendor} (#{vendor.id}): {result["customer"]} customers, {result["transaction"]} transactions'
+                ))
+
+        results = sync_paystack_vendors(
+            list(vendors),
+            concurrency=options['concurrency'],
+            per_vendor=options['per_vendor'],
+            on_done=report,
+        )
+        failed = sum(1 for result in results.values() if 'error' in result)
+        self.stdout.write(f'Synced {len(results) - failed} vendor(s), {failed} failed')
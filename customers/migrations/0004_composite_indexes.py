@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_paystackwebhookevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paystackcustomer',
+            index=models.Index(fields=['vendor', 'created_at'], name='customer_vendor_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paystacktransaction',
+            index=models.Index(fields=['customer', 'status', 'paid_at'], name='tx_customer_status_paid_idx'),
+        ),
+    ]
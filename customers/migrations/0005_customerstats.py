@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:41
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def populate_customer_stats(apps, schema_editor):
+    PaystackCustomer = apps.get_model('customers', 'PaystackCustomer')
+    CustomerStats = apps.get_model('customers', 'CustomerStats')
+    now = timezone.now()
+    success = Q(transactions__status='success')
+    recent = success & Q(transactions__paid_at__gte=now - timedelta(days=90))
+    rows = PaystackCustomer.objects.annotate(
+        spent=Coalesce(Sum('transactions__amount', filter=success), Value(0), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        orders=Count('transactions', filter=success),
+        recent_orders=Count('transactions', filter=recent),
+        last_paid=Max('transactions__paid_at', filter=success),
+    ).values_list('id', 'vendor_id', 'spent', 'orders', 'recent_orders', 'last_paid')
+    batch = []
+    for c, v, s, o, r, l in rows.iterator(chunk_size=2000):
+        batch.append(CustomerStats(customer_id=c, vendor_id=v, total_spent=s, order_count=o, orders_90d=r, last_paid_at=l))
+        if len(batch) == 2000:
+            CustomerStats.objects.bulk_create(batch)
+            batch = []
+    CustomerStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='customers.paystackcustomer')),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('orders_90d', models.PositiveIntegerField(default=0)),
+                ('last_paid_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer_stats', to='customers.vendor')),
+            ],
+        ),
+        migrations.RunPython(populate_customer_stats, migrations.RunPython.noop),
+    ]
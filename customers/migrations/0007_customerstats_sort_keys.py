@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 15:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_customer_created_at(apps, schema_editor):
+    PaystackCustomer = apps.get_model('customers', 'PaystackCustomer')
+    CustomerStats = apps.get_model('customers', 'CustomerStats')
+    CustomerStats.objects.update(
+        customer_created_at=Subquery(
+            PaystackCustomer.objects.filter(id=OuterRef('customer_id')).values('created_at')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0006_customersegment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerstats',
+            name='customer_created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(copy_customer_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customerstats',
+            name='customer_created_at',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='customerstats',
+            index=models.Index(fields=['vendor', 'total_spent', 'customer'], name='stats_vendor_spent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerstats',
+            index=models.Index(fields=['vendor', 'last_paid_at', 'customer'], name='stats_vendor_last_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerstats',
+            index=models.Index(fields=['vendor', 'customer_created_at', 'customer'], name='stats_vendor_created_idx'),
+        ),
+    ]
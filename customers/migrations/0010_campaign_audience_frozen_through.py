@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0009_campaign_recipients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='audience_frozen_through',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0010_campaign_audience_frozen_through'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paystackcustomer',
+            name='customer_code',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='paystackcustomer',
+            constraint=models.UniqueConstraint(fields=('vendor', 'customer_code'), name='unique_vendor_customer_code'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0011_customer_code_per_vendor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paystackwebhookevent',
+            name='error',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -47,7 +47,8 @@ class SubscriptionPlan(models.Model):
         return self.get_name_display()
 
     def get_feature_list(self):
-        return [f.name for f in self.features.all()]
+        from .entitlements import plan_feature_names  # cached; see entitlements.py
+        return list(plan_feature_names(self.id))
 
 
 
@@ -58,6 +59,7 @@ class Vendor(models.Model):
             biz = Vendor.objects.get(id=1)
             print(biz.get_features())  
             # Output: ['Email Support', 'Advanced Reports']
+            biz.has_feature('Advanced Reports')  # True
     """
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     fullname = models.CharField(max_length=255)
@@ -80,17 +82,32 @@ class Vendor(models.Model):
             return self.subscription_plan.get_feature_list()
         return []
 
+    def has_feature(self, name):
+        """ O(1) entitlement check that never loads the plan row """
+        from .entitlements import plan_has_feature
+        return self.subscription_plan_id is not None and plan_has_feature(self.subscription_plan_id, name)
+
     
 class PaystackCustomer(models.Model):
     """ create a paystack customer """
     vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name="customers")
-    customer_code = models.CharField(max_length=100, unique=True)
+    customer_code = models.CharField(max_length=100)  # unique per vendor
     email = models.EmailField()
     first_name = models.CharField(max_length=100, blank=True, null=True)
     last_name = models.CharField(max_length=100, blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField()
 
+    class Meta:
+        constraints = [
+            # Paystack codes are only unique within one vendor's integration; ingest upserts on this
+            models.UniqueConstraint(fields=["vendor", "customer_code"], name="unique_vendor_customer_code"),
+        ]
+        indexes = [
+            # every customer list/segment query is scoped to one vendor
+            models.Index(fields=["vendor", "created_at"], name="customer_vendor_created_idx"),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -107,5 +124,174 @@ class PaystackTransaction(models.Model):
     channel = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # analytics always read a customer's successful transactions by paid_at
+            models.Index(fields=["customer", "status", "paid_at"], name="tx_customer_status_paid_idx"),
+        ]
+
     def __str__(self):
         return f"{self.customer.email} - {self.amount} ({self.status})"
+
+
+
+class PaystackSyncState(models.Model):
+    """ per-vendor high-water marks for the incremental Paystack sync.
+        each cursor is the latest `createdAt` seen for that resource; the next
+        sync only asks Paystack for records from that point on (`from=`).
+    """
+    vendor = models.OneToOneField(Vendor, on_delete=models.CASCADE, related_name="sync_state")
+    customers_synced_to = models.DateTimeField(blank=True, null=True)
+    transactions_synced_to = models.DateTimeField(blank=True, null=True)
+    last_synced_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.vendor} sync state"
+
+
+
+class PaystackWebhookEvent(models.Model):
+    """ buffered Paystack webhook deliveries.
+        each delivery is stored once (event_key is unique) and later flushed into
+        PaystackCustomer / PaystackTransaction in bulk, see webhooks.py; events that
+        fail to ingest are marked processed with their error
+    """
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name="webhook_events")
+    event_key = models.CharField(max_length=255, unique=True)
+    event = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    error = models.TextField(blank=True, default="")  # set when the event could not be written; it is not retried
+
+    def __str__(self):
+        return f"{self.event} ({self.event_key})"
+
+
+
+class CustomerStats(models.Model):
+    """ rollup of a customer's successful transactions, one row per PaystackCustomer.
+        kept current by stats.refresh_customer_stats whenever transactions are ingested;
+        `orders_90d` is relative to the last refresh, so `manage.py rebuild_customer_stats`
+        should also run daily to age it for customers with no new orders.
+    """
+    customer = models.OneToOneField(PaystackCustomer, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name="customer_stats")
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # kobo
+    order_count = models.PositiveIntegerField(default=0)
+    orders_90d = models.PositiveIntegerField(default=0)
+    last_paid_at = models.DateTimeField(blank=True, null=True)
+    customer_created_at = models.DateTimeField()  # copy of customer.created_at, a sort key of the customer list
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the customer list: (vendor, sort key, customer)
+            models.Index(fields=["vendor", "total_spent", "customer"], name="stats_vendor_spent_idx"),
+            models.Index(fields=["vendor", "last_paid_at", "customer"], name="stats_vendor_last_paid_idx"),
+            models.Index(fields=["vendor", "customer_created_at", "customer"], name="stats_vendor_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.customer} stats"
+
+
+
+class CustomerSegment(models.Model):
+    """ vendor-defined segment over the CustomerStats rollup.
+        example rule: "recency_days >= 30 AND orders_90d >= 3" (syntax in segments.py)
+    """
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name="segments")
+    name = models.CharField(max_length=100)
+    rule = models.CharField(max_length=500)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["vendor", "name"], name="unique_vendor_segment_name"),
+        ]
+
+    def __str__(self):
+        return f"{self.name}: {self.rule}"
+
+
+
+class Campaign(models.Model):
+    """ a queued campaign send. send_campaign only creates the row; the
+        `manage.py process_campaigns` worker streams its audience into
+        CampaignRecipient rows, sends them in batches and records progress here,
+        see campaign_jobs.py
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (COMPLETED, "Completed"),
+        (FAILED, "Failed"),
+    ]
+
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE, related_name="campaigns")
+    segment = models.CharField(max_length=100)
+    rule = models.CharField(max_length=500)  # the segment's rule when the campaign was queued
+    channel = models.CharField(max_length=10)
+    subject = models.CharField(max_length=255, blank=True, default="")
+    message = models.TextField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    total_recipients = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    # client-supplied Idempotency-Key of the request that queued it; a repeated request returns this campaign
+    idempotency_key = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    # the ledger is written a chunk at a time while sending; last customer id written so far
+    audience_frozen_through = models.BigIntegerField(blank=True, null=True)
+    audience_frozen_at = models.DateTimeField(blank=True, null=True)  # every recipient written to the ledger
+    heartbeat_at = models.DateTimeField(blank=True, null=True)  # last sign of life of the worker sending it
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["vendor", "idempotency_key"], name="unique_vendor_campaign_idempotency_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.vendor} {self.channel} campaign to {self.segment} ({self.status})"
+
+
+
+class CampaignRecipient(models.Model):
+    """ one recipient of a campaign, frozen when the worker starts it. pending rows are
+        what is left to send; a row is marked sending before its request goes out, so
+        a worker that dies mid-request never mails it twice
+    """
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name="recipients")
+    customer = models.ForeignKey(PaystackCustomer, on_delete=models.SET_NULL, null=True, blank=True)
+    email = models.EmailField()
+    first_name = models.CharField(max_length=100, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    error = models.TextField(blank=True, default="")
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["campaign", "status"], name="campaign_recipient_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.email} ({self.status})"
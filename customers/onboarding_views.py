@@ -2,39 +2,43 @@
 
 # Create your views here.
 from django.conf import settings
-import requests
+from .paystack import PaystackClient, PaystackError
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import PaystackTransaction, Vendor, SubscriptionPlan, Feature, PaystackCustomer
+from .models import Vendor, SubscriptionPlan, Feature, PaystackCustomer, CustomerStats
 from django.utils.timezone import now
 from .utils import (generate_dummy_customers_and_transactions)
+from .segments import customer_status_expression, customer_status_filter, SegmentRuleError
+from .queries import keyset_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .authentication import vendor_required
+from .cache import vendor_etag
 from django.db.models import Sum, Max
 from django.utils.timesince import timesince
-from django.db.models import Sum, Prefetch
 from django.core.cache import cache
 from django.views.decorators.csrf import csrf_exempt
 
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
+# customer list sort keys -> indexed CustomerStats columns
+CUSTOMER_SORTS = {
+    "total_value": "total_spent",
+    "last_order": "last_paid_at",
+    "created_at": "customer_created_at",
+}
+
 
 
 
  
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@vendor_required(load=True)
 def connect_paystack(request):
     """ connecting to paystack only:  """
     
-    user = request.user
-    print("Authenticated user:", user)
-
-    try:
-        vendor = Vendor.objects.get(user=user)
-        print("Found vendor:", vendor)
-    except Vendor.DoesNotExist:
-        return Response({"error": "Vendor not found"}, status=404)
+    vendor = request.vendor
 
     paystack_key = request.data.get("paystack_secret")
     if not paystack_key or not paystack_key.startswith("sk_"):
@@ -53,32 +57,63 @@ def connect_paystack(request):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@vendor_required
+@vendor_etag("paystack_customers", max_age=300)
 def get_paystack_customers(request):
     """
-    Returns a list of customers for the authenticated vendor,
+    Returns a page of customers for the authenticated vendor,
     including total spent, last order time, and status tag.
 
+    Query params:
+    - sort: total_value | last_order | created_at, prefix "-" for descending (default -total_value)
+    - status: High Value | At Risk | Active (optional)
+    - page_size: default 50, max 500
+    - cursor: the `next_cursor` of the previous page
+
     Optimizations:
-    - Uses `prefetch_related` to minimize DB queries
-    - Uses `annotate` to pull aggregates in one DB call
-    - Avoids redundant data processing in Python
+    - Reads the CustomerStats rollup (one small row per customer) joined to the customer
+    - No transaction rows are loaded
+    - Keyset pagination on (vendor, sort key, customer) indexes and the status filter
+      run in the database, so each page is one bounded query
+    - ETag / If-None-Match: unchanged polls get a 304 without running the query
     """
-    vendor = request.user.vendor  # Assuming vendor FK exists
+    vendor = request.vendor
 
-    # Prefetch only successful transactions
-    successful_tx = PaystackTransaction.objects.filter(status="success")
-    customers = (
-        PaystackCustomer.objects.filter(vendor=vendor)
-        .prefetch_related(Prefetch("transactions", queryset=successful_tx))
+    sort = request.query_params.get("sort", "-total_value")
+    field = CUSTOMER_SORTS.get(sort.lstrip("-"))
+    if field is None:
+        return Response({"error": f"sort must be one of {', '.join(CUSTOMER_SORTS)}"}, status=400)
+    try:
+        page_size = min(int(request.query_params.get("page_size", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "page_size must be a number"}, status=400)
+
+    current_time = now()
+    stats = (
+        CustomerStats.objects.filter(vendor=vendor)
+        .select_related("customer")
+        .annotate(status=customer_status_expression(current_time))
     )
+    status_filter = request.query_params.get("status")
+    if status_filter:
+        try:
+            stats = stats.filter(customer_status_filter(status_filter, current_time))
+        except SegmentRuleError as e:
+            return Response({"error": str(e)}, status=400)
+
+    try:
+        rows, next_cursor = keyset_page(
+            stats, field, sort.startswith("-"), request.query_params.get("cursor"), max(page_size, 1)
+        )
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
 
     result = []
-    current_time = now()
 
-    for customer in customers:
-        txs = customer.transactions.all()
-        total_spent = sum(tx.amount for tx in txs)
-        last_tx = max((tx.paid_at for tx in txs), default=None)
+    for row in rows:
+        customer = row.customer
+        total_spent = row.total_spent
+        last_tx = row.last_paid_at
 
         name = f"{customer.first_name or ''} {customer.last_name or ''}".strip()
         if not name:
@@ -90,13 +125,8 @@ def get_paystack_customers(request):
         else:
             last_order = "No Orders"
 
-        # Status logic
-        if total_spent > 400000:  # Adjusted to kobo if amount is stored in kobo
-            status = "High Value"
-        elif last_tx and (current_time - last_tx).days > 21:
-            status = "At Risk"
-        else:
-            status = "Active"
+        # Status tag is computed in SQL from segments.CUSTOMER_STATUS_RULES
+        status = row.status
 
         result.append({
             "name": name,
@@ -106,21 +136,19 @@ def get_paystack_customers(request):
             "status": status
         })
 
-    return Response({"customers": result})
+    return Response({"customers": result, "next_cursor": next_cursor})
 
 
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@vendor_required(load=True)
 def initiate_subscription(request):
     
     """ initiating subscription for the connected account: Only """
     
-    try:
-        vendor = Vendor.objects.get(user=request.user)
-    except Vendor.DoesNotExist:
-        return Response({"error": "Vendor not found"}, status=404)
+    vendor = request.vendor
 
     if not vendor.paystack_secret:
         return Response({"error": "Vendor has not connected Paystack"}, status=400)
@@ -135,53 +163,35 @@ def initiate_subscription(request):
     if not email or not amount:
         return Response({"error": "Email and amount are required"}, status=400)
 
-    headers = {
-        "Authorization": f"Bearer {vendor.paystack_secret}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "email": email,
-        "amount": amount,
-        "callback_url": settings.PAYSTACK_CALLBACK_URL
-    }
-
-    response = requests.post(
-        "https://api.paystack.co/transaction/initialize",
-        headers=headers,
-        json=payload
-    )
-
-    if response.status_code == 200 and response.json().get("status"):
-        data = response.json()["data"]
-        return Response({
-            "authorization_url": data["authorization_url"],
-            "reference": data["reference"]
-        })
-    else:
+    try:
+        data = PaystackClient(vendor.paystack_secret).initialize_transaction(email, amount)
+    except PaystackError as e:
         return Response({
             "error": "Failed to initiate payment",
-            "details": response.json()
+            "details": e.payload or str(e)
         }, status=400)
 
+    return Response({
+        "authorization_url": data["authorization_url"],
+        "reference": data["reference"]
+    })
+
 
 
 
 # verify vendor subscription transactions
 @api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@vendor_required(load=True)
 def verify_transaction(request, reference):
-    vendor = Vendor.objects.get(user=request.user)
-
-    headers = {
-        "Authorization": f"Bearer {vendor.paystack_secret}",
-    }
-    response = requests.get(
-        f"https://api.paystack.co/transaction/verify/{reference}",
-        headers=headers
-    )
-    res_data = response.json()
+    vendor = request.vendor
+
+    try:
+        data = PaystackClient(vendor.paystack_secret).verify_transaction(reference)
+    except PaystackError:
+        return Response({"error": "Verification failed"}, status=400)
 
-    if res_data["status"] and res_data["data"]["status"] == "success":
+    if data["status"] == "success":
         # Mark vendor as subscribed
         vendor.subscription_active = True
         vendor.save()
@@ -193,11 +203,12 @@ def verify_transaction(request, reference):
 #getting client customers
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@vendor_required
 def get_paystack_customers_0(request):
     
     """ fetching all customer for the authenticated vendor """
     
-    vendor = request.user.vendor  # Assuming vendor is linked to user
+    vendor = request.vendor
 
     customers = PaystackCustomer.objects.filter(vendor=vendor)
 
@@ -296,28 +307,19 @@ def full_paystack_onboard(request):
     
     # step8: initiate a transaction for testing purpose   
     
-    headers = {
-        "Authorization": f"Bearer {paystack_secret}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "email": user.email,
-        "amount": 100 * 100,  # Paystack uses Kobo
-        "callback_url": settings.PAYSTACK_CALLBACK_URL
-    }
-
-    response = requests.post("https://api.paystack.co/transaction/initialize", headers=headers, json=payload)
-
-    if response.status_code == 200 and response.json().get("status"):
-        data = response.json()["data"]
+    try:
+        data = PaystackClient(paystack_secret).initialize_transaction(
+            user.email,
+            100 * 100,  # Paystack uses Kobo
+        )
+    except PaystackError as e:
         return Response({
-            "message": "Onboarding complete. Redirect to payment page.",
-            "authorization_url": data["authorization_url"],
-            "reference": data["reference"]
-        })
+            "error": "Failed to initiate payment",
+            "details": e.payload or str(e)
+        }, status=400)
 
     return Response({
-        "error": "Failed to initiate payment",
-        "details": response.json()
-    }, status=400)
+        "message": "Onboarding complete. Redirect to payment page.",
+        "authorization_url": data["authorization_url"],
+        "reference": data["reference"]
+    })
@@ -0,0 +1,101 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+
+
+""" Paystack API client
+
+    All Paystack calls go through here so they share one keep-alive connection pool
+    per worker thread (no TLS handshake per call), always carry connect/read
+    timeouts, and retry idempotent requests with backoff on 429/5xx.
+    Responses are parsed in one place: anything but a 2xx with `"status": true`
+    raises PaystackError.
+"""
+
+PAYSTACK_BASE_URL = "https://api.paystack.co"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_local = threading.local()
+
+
+class PaystackError(Exception):
+    def __init__(self, message, status_code=None, payload=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.payload = payload or {}
+
+
+def get_session():
+    """ one pooled session per thread; requests.Session is not thread-safe """
+    session = getattr(_local, "session", None)
+    if session is None:
+        retry = Retry(
+            total=settings.PAYSTACK_MAX_RETRIES,
+            backoff_factor=settings.PAYSTACK_RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET"}),  # never replay a payment initialization
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_maxsize=settings.PAYSTACK_POOL_SIZE, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _local.session = session
+    return session
+
+
+class PaystackClient:
+    """ example:
+            client = PaystackClient(vendor.paystack_secret)
+            data = client.verify_transaction(reference)
+    """
+
+    def __init__(self, secret_key):
+        self.secret_key = secret_key
+
+    def request(self, method, path, **kwargs):
+        headers = {"Authorization": f"Bearer {self.secret_key}"}
+        timeout = (settings.PAYSTACK_CONNECT_TIMEOUT, settings.PAYSTACK_READ_TIMEOUT)
+        try:
+            response = get_session().request(
+                method, f"{PAYSTACK_BASE_URL}{path}", headers=headers, timeout=timeout, **kwargs
+            )
+        except requests.RequestException as e:
+            raise PaystackError(f"Paystack request failed: {e}") from e
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+
+        if not response.ok or not body.get("status"):
+            message = body.get("message") or f"Paystack returned HTTP {response.status_code}"
+            raise PaystackError(message, status_code=response.status_code, payload=body)
+        return body
+
+    def get(self, path, params=None):
+        return self.request("GET", path, params=params)
+
+    def post(self, path, payload=None):
+        return self.request("POST", path, json=payload)
+
+    def list_page(self, resource, **params):
+        """ one page of a list endpoint: returns (rows, page_count) """
+        body = self.get(f"/{resource}", params=params)
+        page_count = (body.get("meta") or {}).get("pageCount") or 1
+        return body.get("data", []), page_count
+
+    def initialize_transaction(self, email, amount, callback_url=None):
+        payload = {
+            "email": email,
+            "amount": amount,
+            "callback_url": callback_url or settings.PAYSTACK_CALLBACK_URL,
+        }
+        return self.post("/transaction/initialize", payload)["data"]
+
+    def verify_transaction(self, reference):
+        return self.get(f"/transaction/verify/{reference}")["data"]
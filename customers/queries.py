@@ -0,0 +1,110 @@
+import base64
+import json
+from datetime import timedelta
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+from django.utils import timezone
+from .models import PaystackCustomer, PaystackTransaction
+
+
+
+""" customer filters that run as database queries over the synced Paystack tables """
+
+CUSTOMER_FIELDS = ("id", "customer_code", "email", "first_name", "last_name", "phone", "created_at")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def filter_customers(vendor, filter_type, value=0, days=0, now=None):
+    """
+    Returns the vendor's customers matching one dynamic filter:
+    - spend_more_than: total successful spend > value (naira)
+    - ordered_in_last: at least `value` successful orders in the last `days` days
+    - last_visited: a successful order within the last `days` days
+    """
+    now = now or timezone.now()
+    customers = PaystackCustomer.objects.filter(vendor=vendor)
+
+    if filter_type == "spend_more_than":
+        kobo = Decimal(str(value)) * 100  # amounts are stored in kobo
+        if kobo < 0:
+            return customers
+        # filtering before annotate keeps the join on (customer, status), see tx_customer_status_paid_idx
+        return customers.filter(transactions__status="success").annotate(
+            total_spent=Sum("transactions__amount")
+        ).filter(total_spent__gt=kobo)
+
+    if filter_type == "ordered_in_last":
+        if value <= 0:
+            return customers
+        return customers.filter(
+            transactions__status="success",
+            transactions__paid_at__gte=now - timedelta(days=days),
+        ).annotate(
+            recent_orders=Count("transactions")
+        ).filter(recent_orders__gte=value)
+
+    if filter_type == "last_visited":
+        # "(now - last order).days <= days" means the last order is newer than days + 1
+        recent = PaystackTransaction.objects.filter(
+            customer=OuterRef("pk"),
+            status="success",
+            paid_at__gt=now - timedelta(days=days + 1),
+        )
+        return customers.filter(Exists(recent))
+
+    raise ValueError(f"Unknown filter_type: {filter_type}")
+
+
+
+def encode_cursor(value, pk):
+    # str() keeps full microsecond precision for datetimes and exact Decimals
+    return base64.urlsafe_b64encode(json.dumps([value, pk], default=str).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """ (value, pk) of the last row of the previous page; raises ValueError when malformed """
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return value, pk
+
+
+def keyset_queryset(queryset, field, descending, cursor):
+    """ `queryset` ordered by (field, pk) and narrowed to the rows after `cursor`, see keyset_page """
+    cmp = "lt" if descending else "gt"
+    key = F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)
+    queryset = queryset.order_by(key, "-pk" if descending else "pk")
+
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        try:
+            value = queryset.model._meta.get_field(field).to_python(value)
+        except ValidationError:
+            raise ValueError("Invalid cursor")
+        if value is None:
+            queryset = queryset.filter(**{f"{field}__isnull": True, f"pk__{cmp}": pk})
+        else:
+            queryset = queryset.filter(
+                Q(**{f"{field}__{cmp}": value})
+                | Q(**{field: value, f"pk__{cmp}": pk})
+                | Q(**{f"{field}__isnull": True})
+            )
+    return queryset
+
+
+def keyset_page(queryset, field, descending, cursor, page_size):
+    """
+    One page of `queryset` ordered by (field, pk), starting after `cursor`.
+    Rows are selected with a range condition on the sort key rather than an OFFSET,
+    so every page is a bounded index scan however deep the client pages.
+    NULL sort values come last in either direction. Returns (rows, next_cursor).
+    """
+    rows = list(keyset_queryset(queryset, field, descending, cursor)[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    last = rows[page_size - 1]
+    return rows[:page_size], encode_cursor(getattr(last, field), last.pk)
@@ -0,0 +1,116 @@
+from django.db import connections
+from django.db.models import BigIntegerField, F, Window
+from django.db.models.functions import Cast, CumeDist, Round
+from .models import CustomerStats
+
+
+
+""" RFM (recency / frequency / monetary) scoring
+
+    Each customer with at least one order gets a 1-5 score per dimension from the
+    vendor's own quantiles (5 = most recent / most orders / highest spend), so the
+    scores mean the same thing for a vendor with 50 customers as for one with 500k.
+
+    A score is the customer's cumulative share of the vendor's customers,
+    ceil(5 * share of customers with the same or a lower value), so tied values
+    (the many customers with a single order, say) always share a score instead of
+    being split across buckets. The shares come from three CUME_DIST windows in a
+    single query over the CustomerStats rollup; on databases without window
+    functions they are counted from NumPy columns. Both paths bucket them with the
+    same integer arithmetic. NumPy is imported when scores are computed, so processes
+    that never serve RFM do not load it.
+"""
+
+RFM_BUCKETS = 5
+
+# first matching rule wins, checked in order
+RFM_SEGMENTS = [
+    ("Champions", lambda r, f, m: (r >= 4) & (f >= 4)),
+    ("Loyal Customers", lambda r, f, m: (r >= 3) & (f >= 4)),
+    ("Big Spenders", lambda r, f, m: (r >= 3) & (m >= 5)),
+    ("New Customers", lambda r, f, m: (r >= 4) & (f <= 1)),
+    ("Potential Loyalists", lambda r, f, m: r >= 4),
+    ("At Risk", lambda r, f, m: (r <= 2) & (f >= 3)),
+    ("Hibernating", lambda r, f, m: r <= 2),
+]
+DEFAULT_RFM_SEGMENT = "Needs Attention"
+
+
+def _scored_stats(vendor):
+    return CustomerStats.objects.filter(vendor=vendor, order_count__gt=0)
+
+
+def bucket(at_or_below, n, buckets=RFM_BUCKETS):
+    """ ceil(buckets * at_or_below / n) in integers: 1..buckets, equal for equal counts """
+    return (at_or_below * buckets + n - 1) // n
+
+
+def _cume_dist_window(field):
+    return Window(CumeDist(), order_by=F(field).asc())
+
+
+def _scores_sql(vendor):
+    import numpy as np
+
+    rows = list(
+        _scored_stats(vendor)
+        .annotate(r=_cume_dist_window("last_paid_at"), f=_cume_dist_window("order_count"), m=_cume_dist_window("total_spent"))
+        .values_list("customer_id", "r", "f", "m")
+    )
+    if not rows:
+        return np.empty((0, 4), dtype=np.int64)
+    columns = np.array(rows, dtype=np.float64)
+    n = len(rows)
+    at_or_below = np.rint(columns[:, 1:] * n).astype(np.int64)  # CUME_DIST is that count / n
+    return np.column_stack([columns[:, 0].astype(np.int64), bucket(at_or_below, n)])
+
+
+def cume_scores(values, buckets=RFM_BUCKETS):
+    """ the scores of CUME_DIST() OVER (ORDER BY values): rows with equal values always score alike """
+    import numpy as np
+    at_or_below = np.searchsorted(np.sort(values), values, side="right")
+    return bucket(at_or_below, len(values), buckets)
+
+
+def _scores_numpy(vendor):
+    import numpy as np
+    from .analytics import EpochMicroseconds
+
+    rows = _scored_stats(vendor).values_list(
+        "customer_id", EpochMicroseconds("last_paid_at"), "order_count", Cast(Round(F("total_spent") * 100), BigIntegerField())
+    )
+    with connections[rows.db].cursor() as cursor:
+        cursor.execute(*rows.query.sql_with_params())
+        columns = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 4)
+
+    ids = columns[:, 0]
+    return np.column_stack([ids] + [cume_scores(columns[:, i]) for i in (1, 2, 3)])
+
+
+def compute_rfm(vendor, use_windows=None):
+    """
+    {"customer_ids", "recency", "frequency", "monetary", "segment"} arrays (segment is an
+    index into segment_names), best customers first, plus score distributions.
+    """
+    import numpy as np
+
+    if use_windows is None:
+        use_windows = connections[CustomerStats.objects.db].features.supports_over_clause
+    scores = _scores_sql(vendor) if use_windows else _scores_numpy(vendor)
+
+    ids, r, f, m = scores[:, 0], scores[:, 1], scores[:, 2], scores[:, 3]
+    segment_names = [name for name, _ in RFM_SEGMENTS] + [DEFAULT_RFM_SEGMENT]
+    segment = np.select([rule(r, f, m) for _, rule in RFM_SEGMENTS], range(len(RFM_SEGMENTS)), len(RFM_SEGMENTS))
+
+    order = np.lexsort((ids, -(r + f + m)))
+    distribution = lambda s: dict(zip(range(1, RFM_BUCKETS + 1), np.bincount(s, minlength=RFM_BUCKETS + 1)[1:].tolist()))
+    return {
+        "customer_ids": ids[order],
+        "recency": r[order].astype(np.int8),
+        "frequency": f[order].astype(np.int8),
+        "monetary": m[order].astype(np.int8),
+        "segment": segment[order].astype(np.int8),
+        "segment_names": segment_names,
+        "distribution": {"recency": distribution(r), "frequency": distribution(f), "monetary": distribution(m)},
+        "segments": dict(zip(segment_names, np.bincount(segment, minlength=len(segment_names)).tolist())),
+    }
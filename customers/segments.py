@@ -0,0 +1,253 @@
+import re
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Case, CharField, Count, Q, Value, When
+from django.utils import timezone
+from .models import CustomerStats, CustomerSegment
+
+
+
+""" segment rule engine
+
+    Segments are declared once as small rules over the CustomerStats rollup, e.g.
+        "orders_90d >= 3"
+        "order_count = 0 OR recency_days >= 90"
+        "(total_spent > 500 AND recency_days < 30) OR orders_90d >= 10"
+    and compiled into Q objects, so counting, listing members and targeting a
+    campaign are all plain indexed queries on customers_customerstats.
+
+    Fields:
+    - recency_days: whole days since the last successful order (no orders never matches)
+    - order_count: successful orders overall
+    - orders_90d: successful orders in the last 90 days (exact after each refresh of the
+      customer's stats; `manage.py rebuild_customer_stats` should run daily to age it,
+      customers with no order in the window always count as 0)
+    - total_spent: total successful spend in naira
+"""
+
+AUDIENCE_CHUNK_SIZE = 5000  # recipients per audience_chunks query
+
+BUILTIN_SEGMENTS = {
+    # name: (dashboard key, rule)
+    "Loyal Customers": ("loyal_customers", "orders_90d >= 3"),
+    "High Value Customers": ("high_value_customers", "total_spent > 500"),
+    "At-Risk Customers": ("at_risk_customers", "recency_days >= 30"),
+    "Dormant Customers": ("dormant_customers", "order_count = 0 OR recency_days >= 90"),
+}
+
+# status tag shown in the customer list: first matching rule wins
+CUSTOMER_STATUS_RULES = [
+    ("High Value", "total_spent > 4000"),
+    ("At Risk", "recency_days > 21"),
+]
+DEFAULT_CUSTOMER_STATUS = "Active"
+
+RECENT_DAYS = 90  # window of orders_90d
+
+FIELDS = ("recency_days", "order_count", "orders_90d", "total_spent")
+OPERATORS = {">=": "gte", "<=": "lte", ">": "gt", "<": "lt", "=": "exact", "!=": "exact"}
+
+TOKEN_RE = re.compile(r"\s*(?:(\()|(\))|(>=|<=|!=|=|>|<)|(\d+(?:\.\d+)?)|([A-Za-z_][A-Za-z0-9_]*))")
+
+
+class SegmentRuleError(ValueError):
+    pass
+
+
+def _tokenize(rule):
+    tokens, pos, rule = [], 0, rule.strip()
+    while pos < len(rule):
+        match = TOKEN_RE.match(rule, pos)
+        if not match or match.end() == pos:
+            raise SegmentRuleError(f"Unexpected input at position {pos}: {rule[pos:pos + 10]!r}")
+        lparen, rparen, op, number, word = match.groups()
+        if lparen or rparen:
+            tokens.append(("paren", lparen or rparen))
+        elif op:
+            tokens.append(("op", op))
+        elif number:
+            tokens.append(("number", number))
+        elif word.upper() in ("AND", "OR"):
+            tokens.append(("bool", word.upper()))
+        else:
+            tokens.append(("field", word.lower()))
+        pos = match.end()
+    return tokens
+
+
+def _condition(field, op, number, now):
+    """ compile one `field op number` comparison into a Q over CustomerStats """
+    if field == "total_spent":
+        number = Decimal(number) * 100  # naira to kobo
+    elif field == "recency_days":
+        if "." in number:
+            raise SegmentRuleError("recency_days must be compared with whole days")
+        return _recency(op, int(number), now)
+    else:
+        if "." in number:
+            raise SegmentRuleError(f"{field} must be compared with a whole number")
+        number = int(number)
+
+    q = Q(**{f"{field}__{OPERATORS[op]}": number})
+    q = ~q if op == "!=" else q
+    if field == "orders_90d":
+        return _orders_recent(q, op, number, now)
+    return q
+
+
+def _orders_recent(q, op, number, now):
+    """ the stored orders_90d is as of the customer's last refresh; once the last order is
+        older than the window the count is 0 whatever is stored, so it is compared as 0 """
+    recent = Q(last_paid_at__gt=now - timedelta(days=RECENT_DAYS))
+    zero_matches = {">=": 0 >= number, "<=": 0 <= number, ">": 0 > number, "<": 0 < number,
+                    "=": number == 0, "!=": number != 0}[op]
+    return (recent & q) | ~recent if zero_matches else recent & q
+
+
+def _recency(op, days, now):
+    """ (now - last_paid_at).days compared with days, written as a range on last_paid_at """
+    at_least = lambda d: Q(last_paid_at__lte=now - timedelta(days=d))
+    at_most = lambda d: Q(last_paid_at__gt=now - timedelta(days=d + 1))
+    if op == ">=":
+        return at_least(days)
+    if op == ">":
+        return at_least(days + 1)
+    if op == "<=":
+        return at_most(days)
+    if op == "<":
+        return at_most(days - 1)
+    if op == "=":
+        return at_least(days) & at_most(days)
+    return Q(last_paid_at__isnull=False) & ~(at_least(days) & at_most(days))
+
+
+class _Parser:
+    """ rule := term (OR term)* ; term := factor (AND factor)* ; factor := ( rule ) | condition """
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.pos = 0
+        self.now = now
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind, value=None):
+        token_kind, token_value = self.peek()
+        if token_kind != kind or (value is not None and token_value != value):
+            expected = value or kind
+            raise SegmentRuleError(f"Expected {expected} but found {token_value or 'end of rule'}")
+        self.pos += 1
+        return token_value
+
+    def parse(self):
+        q = self.rule()
+        if self.pos != len(self.tokens):
+            raise SegmentRuleError(f"Unexpected {self.peek()[1]!r}")
+        return q
+
+    def rule(self):
+        q = self.term()
+        while self.peek() == ("bool", "OR"):
+            self.pos += 1
+            q = q | self.term()
+        return q
+
+    def term(self):
+        q = self.factor()
+        while self.peek() == ("bool", "AND"):
+            self.pos += 1
+            q = q & self.factor()
+        return q
+
+    def factor(self):
+        if self.peek() == ("paren", "("):
+            self.pos += 1
+            q = self.rule()
+            self.take("paren", ")")
+            return q
+        field = self.take("field")
+        if field not in FIELDS:
+            raise SegmentRuleError(f"Unknown field {field!r}; use one of {', '.join(FIELDS)}")
+        op = self.take("op")
+        number = self.take("number")
+        return _condition(field, op, number, self.now)
+
+
+def compile_rule(rule, now=None):
+    """ compile a segment rule into a Q over CustomerStats; raises SegmentRuleError """
+    if not rule or not rule.strip():
+        raise SegmentRuleError("Rule is empty")
+    return _Parser(_tokenize(rule), now or timezone.now()).parse()
+
+
+def get_segment_rule(vendor, name):
+    """ rule text of a built-in segment or one of the vendor's custom segments, else None """
+    if name in BUILTIN_SEGMENTS:
+        return BUILTIN_SEGMENTS[name][1]
+    return CustomerSegment.objects.filter(vendor=vendor, name=name).values_list("rule", flat=True).first()
+
+
+def segment_members(vendor, rule, now=None):
+    """ the vendor's CustomerStats rows matching a rule """
+    return CustomerStats.objects.filter(vendor=vendor).filter(compile_rule(rule, now))
+
+
+def audience_chunks(vendor, rule, chunk_size=AUDIENCE_CHUNK_SIZE, after=None, now=None):
+    """ the rule's members that have an email, as lists of (customer_id, email, first_name)
+        in customer id order. every chunk is its own short keyset query (customer_id > the
+        last id seen), so no cursor stays open while the caller works on a chunk and a
+        stopped caller can resume from `after`. `now` is fixed for all chunks.
+    """
+    now = now or timezone.now()
+    members = (
+        segment_members(vendor, rule, now).exclude(customer__email="")
+        .order_by("customer_id").values_list("customer_id", "customer__email", "customer__first_name")
+    )
+    while True:
+        chunk = list((members if after is None else members.filter(customer_id__gt=after))[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1][0]
+
+
+def segment_count_aggregates(segments, now=None):
+    """ {key: Count(filter=...)} for use in a single .aggregate() call """
+    now = now or timezone.now()
+    return {key: Count("pk", filter=compile_rule(rule, now)) for key, rule in segments.items()}
+
+
+def segment_counts(vendor, segments, now=None):
+    """ counts for many {name: rule} segments in one query """
+    if not segments:
+        return {}
+    names = list(segments)
+    aliases = {f"segment_{i}": segments[name] for i, name in enumerate(names)}  # names may hold spaces
+    counts = CustomerStats.objects.filter(vendor=vendor).aggregate(**segment_count_aggregates(aliases, now))
+    return {name: counts[f"segment_{i}"] for i, name in enumerate(names)}
+
+
+def customer_status_expression(now=None):
+    """ SQL CASE giving each customer its status tag from CUSTOMER_STATUS_RULES """
+    now = now or timezone.now()
+    return Case(
+        *[When(compile_rule(rule, now), then=Value(status)) for status, rule in CUSTOMER_STATUS_RULES],
+        default=Value(DEFAULT_CUSTOMER_STATUS),
+        output_field=CharField(),
+    )
+
+
+def customer_status_filter(status, now=None):
+    """ Q selecting the customers whose status tag (see customer_status_expression) is `status` """
+    now = now or timezone.now()
+    earlier = Q()
+    for name, rule in CUSTOMER_STATUS_RULES:
+        q = compile_rule(rule, now)
+        if name == status:
+            return earlier & q
+        earlier &= ~q
+    if status == DEFAULT_CUSTOMER_STATUS:
+        return earlier
+    raise SegmentRuleError(f"Unknown status {status!r}")
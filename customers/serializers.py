@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Vendor, Feature, SubscriptionPlan
+from .models import Vendor, Feature, SubscriptionPlan, CustomerSegment, Campaign
+from .segments import compile_rule, SegmentRuleError, BUILTIN_SEGMENTS
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -48,4 +49,35 @@ class SubscriptionPlanSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SubscriptionPlan
-        fields = ['id', 'name', 'features']
\ No newline at end of file
+        fields = ['id', 'name', 'features']
+
+
+
+class CustomerSegmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CustomerSegment
+        fields = ['id', 'name', 'rule', 'created_at']
+        read_only_fields = ['created_at']
+
+    def validate_name(self, value):
+        if value in BUILTIN_SEGMENTS:
+            raise serializers.ValidationError(f'"{value}" is a built-in segment')
+        return value
+
+    def validate_rule(self, value):
+        try:
+            compile_rule(value)
+        except SegmentRuleError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+
+
+class CampaignSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Campaign
+        fields = [
+            "id", "segment", "channel", "subject", "status", "total_recipients",
+            "sent_count", "failed_count", "error", "created_at", "started_at", "audience_frozen_at",
+            "finished_at",
+        ]
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import PaystackCustomer, PaystackTransaction, User, Vendor, Feature, SubscriptionPlan
+from .cache import bump_vendor_version
+from .authentication import revoke_token_claims
+from .entitlements import invalidate_plan_features
+from .stats import ensure_customer_stats, refresh_customer_stats
+
+
+
+""" keep the CustomerStats rollup and a vendor's cached results current when its customers
+    or transactions are changed one at a time (admin, dummy data, edits and deletes).
+    bulk ingestion (ingest.py) sends no model signals and does both itself.
+
+    user/vendor changes revoke the claims of already issued access tokens
+    (see authentication.py, stateless mode), and plan/feature changes clear the
+    in-process entitlement table (entitlements.py).
+"""
+
+
+@receiver([post_save, post_delete], sender=PaystackCustomer)
+def customer_changed(sender, instance, created=False, **kwargs):
+    if created:
+        # the dashboard, customer list and segments only read CustomerStats
+        ensure_customer_stats(instance.vendor, {instance.id: instance.created_at})
+    transaction.on_commit(lambda: bump_vendor_version(instance.vendor_id))
+
+
+@receiver([post_save, post_delete], sender=PaystackTransaction)
+def transaction_changed(sender, instance, **kwargs):
+    customer_id = instance.customer_id
+    vendor_id = PaystackCustomer.objects.filter(id=customer_id).values_list("vendor_id", flat=True).first()
+    if vendor_id:
+        transaction.on_commit(lambda: refresh_customer_stats([customer_id]))
+        transaction.on_commit(lambda: bump_vendor_version(vendor_id))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: revoke_token_claims(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Vendor)
+def vendor_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: revoke_token_claims(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=Feature)
+@receiver([post_save, post_delete], sender=SubscriptionPlan)
+@receiver(m2m_changed, sender=SubscriptionPlan.features.through)
+def plan_features_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_plan_features)
@@ -0,0 +1,171 @@
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+from django.conf import settings
+from django.db.models import Count, Max, Q, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import CustomerStats, PaystackCustomer, PaystackTransaction, Vendor
+from .cache import bump_vendor_version
+from .segments import BUILTIN_SEGMENTS, RECENT_DAYS, segment_count_aggregates
+
+
+
+""" CustomerStats rollup maintenance
+
+    Rows are recomputed from the transactions table for just the customers that
+    changed, with one grouped query and one bulk upsert per chunk, so ingestion keeps
+    the rollup exact without re-reading a vendor's whole history.
+
+    Full rebuilds of vendors above ANALYTICS_VECTORIZE_THRESHOLD transactions read the
+    history once into NumPy columns instead (see analytics.py).
+"""
+
+CHUNK_SIZE = 500
+STATS_FIELDS = ["vendor", "total_spent", "order_count", "orders_90d", "last_paid_at", "customer_created_at", "updated_at"]
+
+
+def _chunks(ids, size=CHUNK_SIZE):
+    ids = iter(ids)
+    while chunk := list(islice(ids, size)):
+        yield chunk
+
+
+def aggregate_customers(customers, now):
+    """ (id, vendor_id, spent, orders, recent_orders, last_paid, created_at) rows, one grouped query """
+    success = Q(transactions__status="success")
+    recent = success & Q(transactions__paid_at__gte=now - timedelta(days=RECENT_DAYS))
+    return (
+        customers
+        .annotate(
+            spent=Coalesce(
+                Sum("transactions__amount", filter=success),
+                Value(0),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+            orders=Count("transactions", filter=success),
+            recent_orders=Count("transactions", filter=recent),
+            last_paid=Max("transactions__paid_at", filter=success),
+        )
+        .values_list("id", "vendor_id", "spent", "orders", "recent_orders", "last_paid", "created_at")
+    )
+
+
+def _upsert_stats(stats):
+    CustomerStats.objects.bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=["customer"],
+        update_fields=STATS_FIELDS,
+    )
+    return len(stats)
+
+
+def refresh_customer_stats(customer_ids, now=None):
+    """ recompute the rollup rows of the given customers; returns rows written """
+    now = now or timezone.now()
+    written = 0
+
+    for chunk in _chunks(customer_ids):
+        rows = aggregate_customers(PaystackCustomer.objects.filter(id__in=chunk), now)
+        written += _upsert_stats([
+            CustomerStats(
+                customer_id=customer_id,
+                vendor_id=vendor_id,
+                total_spent=spent,
+                order_count=orders,
+                orders_90d=recent_orders,
+                last_paid_at=last_paid,
+                customer_created_at=created_at,
+                updated_at=now,
+            )
+            for customer_id, vendor_id, spent, orders, recent_orders, last_paid, created_at in rows
+        ])
+    return written
+
+
+def rebuild_vendor_stats_vectorized(vendor, now=None):
+    """ recompute all of a vendor's rollup rows from one columnar read of its transactions """
+    # NumPy only loads for the rare vendor past ANALYTICS_VECTORIZE_THRESHOLD, not with every view
+    import numpy as np
+    from .analytics import customer_aggregates, from_micros
+
+    now = now or timezone.now()
+    agg = customer_aggregates(vendor, RECENT_DAYS, now)
+    written = 0
+
+    customers = (
+        PaystackCustomer.objects.filter(vendor=vendor).order_by("id")
+        .values_list("id", "created_at").iterator(chunk_size=CHUNK_SIZE)
+    )
+    for chunk in _chunks(customers):
+        ids = np.array([customer_id for customer_id, _ in chunk], dtype=np.int64)
+        pos = np.minimum(np.searchsorted(agg.customer_ids, ids), max(len(agg) - 1, 0))
+        found = (agg.customer_ids[pos] == ids) if len(agg) else np.zeros(len(ids), dtype=bool)
+
+        stats = []
+        for (customer_id, created_at), i, has_orders in zip(chunk, pos.tolist(), found.tolist()):
+            stats.append(CustomerStats(
+                customer_id=customer_id,
+                vendor_id=vendor.id,
+                total_spent=Decimal(int(agg.total_spent[i])) / 100 if has_orders else Decimal(0),
+                order_count=int(agg.order_count[i]) if has_orders else 0,
+                orders_90d=int(agg.orders_recent[i]) if has_orders else 0,
+                last_paid_at=from_micros(agg.last_paid_at[i]) if has_orders else None,
+                customer_created_at=created_at,
+                updated_at=now,
+            ))
+        written += _upsert_stats(stats)
+    return written
+
+
+def ensure_customer_stats(vendor, created_at_by_id):
+    """ create empty rollup rows for new customers ({customer_id: created_at}); existing rows are left alone """
+    CustomerStats.objects.bulk_create(
+        [
+            CustomerStats(customer_id=customer_id, vendor=vendor, customer_created_at=created_at)
+            for customer_id, created_at in created_at_by_id.items()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def vendor_transaction_count(vendor):
+    return PaystackTransaction.objects.filter(customer__vendor=vendor, status="success").count()
+
+
+def rebuild_customer_stats(vendor=None):
+    """ recompute every rollup row, optionally for one vendor only """
+    vendors = [vendor] if vendor is not None else Vendor.objects.order_by("id")
+
+    written = 0
+    for vendor in vendors:
+        if vendor_transaction_count(vendor) >= settings.ANALYTICS_VECTORIZE_THRESHOLD:
+            written += rebuild_vendor_stats_vectorized(vendor)
+        else:
+            customers = PaystackCustomer.objects.filter(vendor=vendor).order_by("id")
+            for chunk in _chunks(customers.values_list("id", flat=True).iterator(chunk_size=CHUNK_SIZE)):
+                written += refresh_customer_stats(chunk)
+        bump_vendor_version(vendor.id)
+    return written
+
+
+def summarize_customer_stats(vendor, now=None):
+    """
+    Totals and built-in segment counts (segments.BUILTIN_SEGMENTS) for the vendor's
+    dashboard, in one aggregate query over the rollup rows with a conditional
+    COUNT ... FILTER per segment.
+    """
+    return CustomerStats.objects.filter(vendor=vendor).aggregate(**summary_aggregates(now))
+
+
+def summary_aggregates(now=None):
+    """ the aggregates summarize_customer_stats computes over a vendor's rollup rows """
+    segments = {key: rule for key, rule in BUILTIN_SEGMENTS.values()}
+    return dict(
+        total_customers=Count("pk"),
+        total_orders=Coalesce(Sum("order_count"), 0),
+        total_value=Coalesce(Sum("total_spent"), Value(0), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        last_order=Max("last_paid_at"),
+        **segment_count_aggregates(segments, now),
+    )
@@ -1,3 +1,111 @@
-from django.test import TestCase
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.test import SimpleTestCase, TestCase, override_settings
+from .mailer import SENDGRID_MAX_PERSONALIZATIONS, SendGridMailer
+from .models import PaystackTransaction, PaystackWebhookEvent, User, Vendor
+from .webhooks import buffer_webhook_event, flush_webhook_events
 
-# Create your tests here.
+
+class FakeSendGrid(BaseHTTPRequestHandler):
+    """ stands in for /v3/mail/send: records each request body and answers with the server's status """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append((self.path, self.headers["Authorization"], json.loads(body)))
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        if self.server.status >= 300:
+            self.wfile.write(b'{"errors": [{"message": "bad request"}]}')
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(SENDGRID_API_KEY="SG.test", DEFAULT_FROM_EMAIL="shop@example.com")
+class SendGridMailerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSendGrid)
+        self.server.requests = []
+        self.server.status = 202
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.mailer = SendGridMailer(host=f"http://127.0.0.1:{self.server.server_port}")
+
+    def test_batches_at_most_1000_personalizations_per_request(self):
+        recipients = [(f"customer{i}@example.com", {"{name}": f"Customer{i}"}) for i in range(2500)]
+
+        results = self.mailer.send(recipients, "Hello", "Hi {name}!")
+
+        sizes = [len(body["personalizations"]) for _, _, body in self.server.requests]
+        self.assertEqual(sizes, [SENDGRID_MAX_PERSONALIZATIONS, SENDGRID_MAX_PERSONALIZATIONS, 500])
+        self.assertEqual([result.recipients for result in results], sizes)
+        self.assertTrue(all(result.ok and result.status_code == 202 for result in results))
+        self.assertEqual(sum(result.sent for result in results), 2500)
+        sent_to = [p["to"][0]["email"] for _, _, body in self.server.requests for p in body["personalizations"]]
+        self.assertEqual(sent_to, [email for email, _ in recipients])
+
+    def test_request_body_carries_substitutions_per_recipient(self):
+        self.mailer.send(
+            [("ada@example.com", {"{name}": "Ada", "{total_spent}": "₦12,500"}), ("bob@example.com", {})],
+            "Thanks", "Hi {name}, you've spent {total_spent}",
+        )
+
+        path, authorization, body = self.server.requests[0]
+        self.assertEqual(path, "/v3/mail/send")
+        self.assertEqual(authorization, "Bearer SG.test")
+        self.assertEqual(body, {
+            "personalizations": [
+                {"to": [{"email": "ada@example.com"}], "substitutions": {"{name}": "Ada", "{total_spent}": "₦12,500"}},
+                {"to": [{"email": "bob@example.com"}]},
+            ],
+            "from": {"email": "shop@example.com"},
+            "subject": "Thanks",
+            "content": [{"type": "text/plain", "value": "Hi {name}, you've spent {total_spent}"}],
+        })
+
+    def test_non_2xx_response_is_a_failed_batch_result(self):
+        self.server.status = 400
+
+        result = self.mailer.send_batch([("ada@example.com", {}), ("bob@example.com", {})], "Hello", "Hi")
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.status_code, 400)
+        self.assertIn("bad request", result.error)
+        self.assertEqual((result.recipients, result.sent, result.failed), (2, 0, 2))
+
+    def test_send_batch_refuses_more_than_1000_recipients(self):
+        with self.assertRaises(ValueError):
+            self.mailer.send_batch([("ada@example.com", {})] * (SENDGRID_MAX_PERSONALIZATIONS + 1), "Hello", "Hi")
+        self.assertEqual(self.server.requests, [])
+
+
+class FlushWebhookEventsTests(TestCase):
+
+    def charge(self, reference, **data):
+        return {"event": "charge.success", "data": {
+            "id": reference, "reference": reference, "status": "success", "amount": 250000,
+            "paid_at": "2026-10-01T10:00:00.000Z", "customer": {"customer_code": "CUS_ada", "email": "ada@example.com"},
+            **data,
+        }}
+
+    def test_malformed_event_is_recorded_and_does_not_block_the_batch(self):
+        vendor = Vendor.objects.create(user=User.objects.create(username="shop"), fullname="Shop")
+        malformed = self.charge("ref_bad")
+        del malformed["data"]["amount"]
+        buffer_webhook_event(vendor, malformed)
+        buffer_webhook_event(vendor, self.charge("ref_ok"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(flush_webhook_events(), 2)
+
+        self.assertEqual(list(PaystackTransaction.objects.values_list("reference", flat=True)), ["ref_ok"])
+        events = {ev.event_key.split(":")[-1]: ev for ev in PaystackWebhookEvent.objects.all()}
+        self.assertIsNotNone(events["ref_ok"].processed_at)
+        self.assertEqual(events["ref_ok"].error, "")
+        self.assertIsNotNone(events["ref_bad"].processed_at)
+        self.assertIn("amount", events["ref_bad"].error)
+        self.assertEqual(flush_webhook_events(), 0)
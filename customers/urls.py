@@ -1,7 +1,7 @@
 from django.urls import path
 
 from . import onboarding_views
-from . import onboarding_views, dashboard_views, vendor_views, campaigns, auth_views
+from . import onboarding_views, dashboard_views, vendor_views, campaigns, auth_views, webhook_views, export_views
 
 
 from rest_framework_simplejwt.views import (
@@ -35,13 +35,24 @@ urlpatterns = [
     #fullpaystack onboard
     path('api/connect-paystack/', onboarding_views.full_paystack_onboard, name='connect-paystack'),
     
+    #paystack webhooks: set https://<host>/api/paystack-webhook/<vendor_id>/ as the webhook url on paystack
+    path('api/paystack-webhook/<int:vendor_id>/', webhook_views.paystack_webhook, name='paystack-webhook'),
+    
     
     #customer dashboard / segmentations
     path("api/customers-segment-filter/", dashboard_views.dynamic_segment_filter, name="dynamic-segment-filter"),
     path("api/vendor-dashboard/", dashboard_views.vendor_dashboard, name="vendor-dashboard"),
     path("api/customer-segments/", dashboard_views.get_customer_segments, name="get_customer_segments"),
+    path("api/segments/", dashboard_views.list_create_segments, name="segments"),
+    path("api/segments/customers/", dashboard_views.segment_customers, name="segment-customers"),
+    path("api/rfm/", dashboard_views.rfm_scores, name="rfm-scores"),
+
+    #exports: customers.csv, customers.ndjson, transactions.csv, transactions.ndjson
+    path("api/exports/<str:dataset>.<str:file_format>", export_views.export_data, name="export-data"),
 
     
     #campaigns
-    path("api/email-campaigns/", campaigns.TestSendEmailsView.as_view(), name="email-campaigns")
+    path("api/email-campaigns/", campaigns.TestSendEmailsView.as_view(), name="email-campaigns"),
+    path("api/campaigns/", campaigns.send_campaign, name="send-campaign"),
+    path("api/campaigns/<int:campaign_id>/", campaigns.campaign_status, name="campaign-status"),
 ]   
\ No newline at end of file
@@ -1,6 +1,8 @@
-import requests
 from django.utils.dateparse import parse_datetime
-from .models import Vendor, PaystackCustomer, PaystackTransaction
+from .models import Vendor, PaystackCustomer, PaystackTransaction, PaystackSyncState
+from .ingest import ingest_customers, ingest_transactions
+from .paystack import PaystackClient
+from .stats import refresh_customer_stats
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from datetime import datetime
@@ -14,57 +16,195 @@ from django.core.mail import send_mass_mail
 from django.conf import settings
 
 import os
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .mailer import SendGridMailer
+from .templating import MessageTemplate
 
 
 
-def sync_paystack_data(vendor):
-    """ To periodically fetch Paystack data and store it, create a management command or
-    API to sync customer and transaction data. 
+PAYSTACK_PAGE_SIZE = 100  # largest page Paystack serves on list endpoints
+
+# list endpoint -> PaystackSyncState field holding its high-water mark
+PAYSTACK_SYNC_CURSORS = {
+    "customer": "customers_synced_to",
+    "transaction": "transactions_synced_to",
+}
+
+
+def fetch_paystack_page(vendor, resource, page=1, since=None):
+    """ fetch a single page of `/customer` or `/transaction` for the vendor.
+        returns (rows, page_count) so callers can walk the remaining pages.
     """
-    
-    headers = {
-        "Authorization": f"Bearer {vendor.paystack_secret}"
-    }
-
-    # Customers
-    customer_url = "https://api.paystack.co/customer"
-    customer_res = requests.get(customer_url, headers=headers).json()
-    for cust in customer_res.get("data", []):
-        obj, _ = PaystackCustomer.objects.update_or_create(
-            customer_code=cust["customer_code"],
-            vendor=vendor,
-            defaults={
-                "email": cust["email"],
-                "first_name": cust.get("first_name", ""),
-                "last_name": cust.get("last_name", ""),
-                "phone": cust.get("phone", ""),
-                "created_at": parse_datetime(cust["createdAt"]),
-            }
-        )
+    params = {"perPage": PAYSTACK_PAGE_SIZE, "page": page}
+    if since:
+        # re-read an overlap window behind the cursor: a transaction created before the
+        # cursor that only succeeds later would otherwise never be fetched. ingest upserts,
+        # so the re-read rows are harmless
+        overlap = timedelta(seconds=settings.PAYSTACK_SYNC_OVERLAP)
+        params["from"] = (since - overlap).isoformat()
+    if resource == "transaction":
+        params["status"] = "success"  # only successful payments are stored
+
+    return PaystackClient(vendor.paystack_secret).list_page(resource, **params)
+
+
+def latest_created_at(rows, current=None):
+    """ return the newest `createdAt` among rows, starting from current """
+    for row in rows:
+        created_at = parse_datetime(row.get("createdAt") or "")
+        if created_at and (current is None or created_at > current):
+            current = created_at
+    return current
 
-    # Transactions
-    tx_url = "https://api.paystack.co/transaction"
-    tx_res = requests.get(tx_url, headers=headers, params={"perPage": 100}).json()
-    for tx in tx_res.get("data", []):
-        if tx["status"] != "success":
-            continue
-        cust_code = tx["customer"]["customer_code"]
-        try:
-            customer = PaystackCustomer.objects.get(customer_code=cust_code, vendor=vendor)
-        except PaystackCustomer.DoesNotExist:
-            continue
-        PaystackTransaction.objects.update_or_create(
-            reference=tx["reference"],
-            vendor=vendor,
-            customer=customer,
-            defaults={
-                "amount": tx["amount"],
-                "status": tx["status"],
-                "paid_at": parse_datetime(tx["paid_at"]),
-            }
-        )
+
+def store_paystack_rows(vendor, resource, rows):
+    """ bulk upsert one fetched page; each page commits in its own transaction """
+    if resource == "customer":
+        return ingest_customers(vendor, rows)
+    return ingest_transactions(vendor, rows)
+
+
+def sync_paystack_data(vendor):
+    """ Incrementally sync the vendor's Paystack customers and transactions.
+
+    Every page of each list endpoint is followed to the end. The newest `createdAt`
+    seen is kept on the vendor's PaystackSyncState, and the next run only requests
+    records from that point on (less PAYSTACK_SYNC_OVERLAP, for payments that succeed
+    a while after they were created), so repeat syncs cost a handful of requests
+    instead of re-reading the whole history. A cursor only moves once all of its pages have
+    been stored; a failed run is simply retried from the previous mark.
+
+    Customers are synced before transactions so transactions can be linked to them.
+    """
+    state, _ = PaystackSyncState.objects.get_or_create(vendor=vendor)
+    synced = {}
+
+    for resource, cursor_field in PAYSTACK_SYNC_CURSORS.items():
+        since = getattr(state, cursor_field)
+        high_water = since
+        page, page_count, count = 1, 1, 0
+
+        while page <= page_count:
+            rows, page_count = fetch_paystack_page(vendor, resource, page, since)
+            count += store_paystack_rows(vendor, resource, rows)
+            high_water = latest_created_at(rows, high_water)
+            page += 1
+
+        setattr(state, cursor_field, high_water)
+        state.save(update_fields=[cursor_field])
+        synced[resource] = count
+
+    state.last_synced_at = now()
+    state.save(update_fields=["last_synced_at"])
+    return synced
+
+
+
+class _VendorSync:
+    """ bookkeeping for one vendor inside sync_paystack_vendors """
+
+    def __init__(self, vendor):
+        self.vendor = vendor
+        self.state, _ = PaystackSyncState.objects.get_or_create(vendor=vendor)
+        self.resources = list(PAYSTACK_SYNC_CURSORS)
+        self.synced = {}
+        self.error = None
+        self._start(self.resources.pop(0))
+
+    def _start(self, resource):
+        self.resource = resource
+        self.since = getattr(self.state, PAYSTACK_SYNC_CURSORS[resource])
+        self.high_water = self.since
+        self.next_page = 1
+        self.page_count = 1  # known once page 1 comes back
+        self.in_flight = 0
+        self.synced[resource] = 0
+
+    def can_request(self, per_vendor):
+        if self.error or self.in_flight >= per_vendor:
+            return False
+        # page_count stays 1 until the first page reports the real total
+        return self.next_page <= self.page_count
+
+    def done(self):
+        return self.error is not None or (self.in_flight == 0 and self.next_page > self.page_count)
+
+    def advance(self):
+        """ save the finished resource's cursor and move on; False when nothing is left """
+        if self.error is None:
+            cursor_field = PAYSTACK_SYNC_CURSORS[self.resource]
+            setattr(self.state, cursor_field, self.high_water)
+            self.state.save(update_fields=[cursor_field])
+            if self.resources:
+                self._start(self.resources.pop(0))
+                return True
+            self.state.last_synced_at = now()
+            self.state.save(update_fields=["last_synced_at"])
+        return False
+
+
+def sync_paystack_vendors(vendors, concurrency=None, per_vendor=None, on_done=None):
+    """ Sync many vendors at once with bounded parallelism.
+
+    Page fetches run on a thread pool with at most `concurrency` Paystack requests in
+    flight overall and at most `per_vendor` for any single vendor. Every database write
+    happens on the calling thread as pages complete, so the worker threads never touch
+    the database. A vendor whose fetch fails keeps its previous cursors and is retried
+    from there on the next run; the other vendors carry on.
+
+    Returns {vendor_id: {"customer": n, "transaction": n}} or {"error": "..."} per vendor.
+    `on_done(vendor, result)` is called as soon as each vendor finishes.
+    """
+    concurrency = concurrency or settings.PAYSTACK_SYNC_CONCURRENCY
+    per_vendor = per_vendor or settings.PAYSTACK_SYNC_PER_VENDOR
+
+    waiting = [_VendorSync(vendor) for vendor in vendors]
+    active = []
+    results = {}
+    futures = {}
+
+    def finish(job):
+        active.remove(job)
+        result = {"error": str(job.error)} if job.error else job.synced
+        results[job.vendor.id] = result
+        if on_done:
+            on_done(job.vendor, result)
+
+    def fill(pool):
+        while len(futures) < concurrency:
+            if waiting and len(active) < concurrency:
+                active.append(waiting.pop(0))
+            job = next((j for j in active if j.can_request(per_vendor)), None)
+            if job is None:
+                return
+            page = job.next_page
+            job.next_page += 1
+            job.in_flight += 1
+            future = pool.submit(fetch_paystack_page, job.vendor, job.resource, page, job.since)
+            futures[future] = job
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        fill(pool)
+        while futures:
+            completed, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in completed:
+                job = futures.pop(future)
+                job.in_flight -= 1
+                if job.error is None:
+                    try:
+                        rows, page_count = future.result()
+                        job.synced[job.resource] += store_paystack_rows(job.vendor, job.resource, rows)
+                    except Exception as e:
+                        job.error = e
+                    else:
+                        job.page_count = max(job.page_count, page_count)
+                        job.high_water = latest_created_at(rows, job.high_water)
+
+                if job.done() and not job.in_flight and not job.advance():
+                    finish(job)
+            fill(pool)
+
+    return results
 
 
 
@@ -90,6 +230,7 @@ def generate_dummy_transactions_for_customer(customer):
             reference=reference,
             channel=random.choice(["card", "bank", "ussd", "mobile_money"]),
         )
+    refresh_customer_stats([customer.id])
 
 
 def generate_dummy_customers_for_vendor(vendor):
@@ -133,6 +274,7 @@ def generate_dummy_customers_and_transactions(vendor):
 
 
 def generate_dummy_customers_and_transactions(vendor, count=30, tx_per_customer=10):
+    customer_ids = []
     for _ in range(count):
         email = f"{''.join(random.choices(string.ascii_lowercase, k=6))}@example.com"
         customer = PaystackCustomer.objects.create(
@@ -144,6 +286,7 @@ def generate_dummy_customers_and_transactions(vendor, count=30, tx_per_customer=
             phone="0550000000",
             created_at=now()
         )
+        customer_ids.append(customer.id)
 
         for _ in range(tx_per_customer):
             amount = round(random.uniform(1000, 10000), 2)  # 10.00 to 100.00 NGN in Kobo
@@ -157,16 +300,21 @@ def generate_dummy_customers_and_transactions(vendor, count=30, tx_per_customer=
                 channel="card"
             )
 
+    refresh_customer_stats(customer_ids)
+
 
 
 """  sending emails  """
 def send_email_to_customers(customers, subject, message):
-    messages = []
-    for customer in customers:
-        email = customer.email
-        if email:
-            personalized_msg = message.replace("{name}", customer.first_name or "Customer")
-            messages.append((subject, personalized_msg, "noreply@customers.com", [email]))
+    template = MessageTemplate(message)
+    customers = [customer for customer in customers if customer.email]
+    personalized = template.render_batch(
+        [getattr(customer, "id", None) for customer in customers], [customer.first_name for customer in customers]
+    )
+    messages = [
+        (subject, personalized_msg, "noreply@customers.com", [customer.email])
+        for customer, personalized_msg in zip(customers, personalized)
+    ]
 
     if messages:
         send_mass_mail(messages, fail_silently=True)
@@ -180,21 +328,14 @@ def send_sms_to_customers(subject, message, from_email, recipient_list):
 
 
 
-def send_email_to_customers_using_sendgrid(customers, subject, message_template):
-    sg = SendGridAPIClient(api_key=os.getenv("SENDGRID_API_KEY"))
-    # sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-
-    for customer in customers:
-        if customer.email:
-            personalized_message = message_template.replace("{name}", customer.first_name or "Customer")
-            email = Mail(
-                from_email="noreply@ayigotech.live",
-                to_emails=customer.email,
-                subject=subject,
-                plain_text_content=personalized_message,
-            )
-            try:
-                sg.send(email)
-            except Exception as e:
-                print(f"Error sending to {customer.email}: {e}")
-
+def send_email_to_customers_using_sendgrid(customers, subject, message_template, mailer=None):
+    """ batched send (customers/mailer.py); returns (sent, failed) recipient counts """
+    mailer = mailer or SendGridMailer()
+    template = MessageTemplate(message_template)
+    customers = [customer for customer in customers if customer.email]
+    substitutions = template.substitutions_batch(
+        [getattr(customer, "id", None) for customer in customers], [customer.first_name for customer in customers]
+    )
+    recipients = zip([customer.email for customer in customers], substitutions)
+    results = mailer.send(recipients, subject, message_template)
+    return sum(r.sent for r in results), sum(r.failed for r in results)
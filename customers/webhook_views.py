@@ -0,0 +1,37 @@
+import json
+from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from django.views.decorators.csrf import csrf_exempt
+from .models import Vendor
+from .webhooks import verify_paystack_signature, buffer_webhook_event
+
+
+
+
+@csrf_exempt
+@api_view(["POST"])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def paystack_webhook(request, vendor_id):
+    """
+    Receives Paystack webhook events for a vendor (`charge.success` and customer events).
+
+    - Verifies the `x-paystack-signature` HMAC against the vendor's secret key
+    - Buffers the event (de-duplicated by event id and reference) for bulk ingestion
+    - Always answers quickly so Paystack does not retry a delivery we already have
+    """
+    body = request.body  # read before DRF parses it; the HMAC covers the raw bytes
+    signature = request.headers.get("x-paystack-signature", "")
+
+    vendor = Vendor.objects.filter(id=vendor_id, paystack_connected=True).first()
+    if not vendor or not verify_paystack_signature(vendor.paystack_secret, body, signature):
+        return Response({"error": "Invalid signature"}, status=401)
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return Response({"error": "Invalid payload"}, status=400)
+
+    buffer_webhook_event(vendor, payload)
+    return Response({"status": True})
@@ -0,0 +1,126 @@
+import hashlib
+import hmac
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+from .models import PaystackWebhookEvent
+from .ingest import ingest_customers, ingest_transactions
+
+
+
+""" Paystack webhook buffer
+
+    The webhook view only verifies the signature and appends the event here with a
+    single insert; duplicate deliveries hit the unique event_key and are dropped.
+    Buffered events are flushed into the customer/transaction tables with the same
+    bulk upserts the sync uses by `manage.py flush_paystack_webhooks` (run with
+    --poll as a worker), never inside the webhook request, so Paystack's call stays
+    a single insert however large the backlog is. Each vendor's events are written in
+    their own savepoint, and an event that cannot be written is marked processed with
+    its error, so one malformed delivery never blocks the others.
+"""
+
+TRANSACTION_EVENTS = {"charge.success"}
+CUSTOMER_EVENT_PREFIX = "customer"
+
+
+def verify_paystack_signature(secret, body, signature):
+    """ Paystack signs the raw request body with HMAC-SHA512 of the secret key """
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def is_supported_event(event):
+    return event in TRANSACTION_EVENTS or event.startswith(CUSTOMER_EVENT_PREFIX)
+
+
+def webhook_event_key(vendor, event, data):
+    """ de-duplication key: Paystack resends the same event id / reference on retries """
+    ref = data.get("reference") or data.get("customer_code") or ""
+    return f"{vendor.id}:{event}:{data.get('id', '')}:{ref}"[:255]
+
+
+def buffer_webhook_event(vendor, payload):
+    """ append one event to the buffer; returns False for events we do not ingest """
+    event = payload.get("event") or ""
+    data = payload.get("data") or {}
+    if not is_supported_event(event):
+        return False
+
+    PaystackWebhookEvent.objects.bulk_create(
+        [PaystackWebhookEvent(
+            vendor=vendor,
+            event_key=webhook_event_key(vendor, event, data),
+            event=event,
+            payload=data,
+        )],
+        ignore_conflicts=True,
+    )
+    return True
+
+
+def _ingest(vendor, events):
+    customers = [ev.payload for ev in events if ev.event not in TRANSACTION_EVENTS and ev.payload.get("customer_code")]
+    transactions = [ev.payload for ev in events if ev.event in TRANSACTION_EVENTS]
+    ingest_customers(vendor, customers)
+    ingest_transactions(vendor, transactions)
+
+
+def _ingest_vendor_events(vendor, events):
+    """ one bulk write per vendor in its own savepoint; if it fails, each event on its own,
+        so a malformed event is recorded as failed instead of holding back the rest.
+        returns {event id: error} of the events that could not be written
+    """
+    try:
+        with transaction.atomic():
+            _ingest(vendor, events)
+        return {}
+    except Exception:
+        pass
+
+    errors = {}
+    for ev in events:
+        try:
+            with transaction.atomic():
+                _ingest(vendor, [ev])
+        except Exception as e:
+            errors[ev.id] = f"{type(e).__name__}: {e}"[:1000]
+    return errors
+
+
+def flush_webhook_events(limit=None):
+    """ write buffered events into the local tables with bulk upserts.
+        returns the number of events processed, failed ones included; those keep their
+        error and are not retried.
+    """
+    limit = limit or settings.PAYSTACK_WEBHOOK_FLUSH_SIZE
+
+    with transaction.atomic():
+        events = list(
+            # of=("self",): lock the events only, not the joined vendor rows
+            PaystackWebhookEvent.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(processed_at__isnull=True)
+            .select_related("vendor")
+            .order_by("id")[:limit]
+        )
+        if not events:
+            return 0
+
+        by_vendor = defaultdict(list)
+        for ev in events:
+            by_vendor[ev.vendor].append(ev)
+
+        errors = {}
+        for vendor, vendor_events in by_vendor.items():
+            errors.update(_ingest_vendor_events(vendor, vendor_events))
+
+        processed_at = now()
+        PaystackWebhookEvent.objects.filter(id__in=[ev.id for ev in events if ev.id not in errors]).update(
+            processed_at=processed_at,
+        )
+        for event_id, error in errors.items():
+            PaystackWebhookEvent.objects.filter(id=event_id).update(processed_at=processed_at, error=error)
+    return len(events)